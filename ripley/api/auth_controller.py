@@ -84,7 +84,7 @@ def update_user_session():
             uid=uid,
             canvas_masquerading_user_id=canvas_masquerading_user_id,
         )
-        user = User(user_id)
+        user = User(user_id, refresh=True)
         if user.is_authenticated and (user.is_admin or len(user.canvas_site_user_roles)):
             logout_user()
             # Re-authenticate
@@ -144,7 +144,7 @@ def _get_custom_param(lti_data, key):
 
 def _start_login_session(uid, canvas_site_id=None, redirect_path=None):
     user_id = User.get_serialized_composite_key(canvas_site_id=canvas_site_id, uid=uid)
-    user = User(user_id)
+    user = User(user_id, refresh=True)
     error = None
     if not user.is_authenticated:
         error = f'Sorry, UID {uid} failed to authenticate.'
@@ -24,8 +24,10 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 from flask import current_app as app
+from ripley.api.errors import ResourceNotFoundError
 from ripley.api.util import admin_required
-from ripley.externals.redis import delete_cache_key, delete_cache_prefix, flushdb
+from ripley.externals.redis import CACHE_NAMESPACES, delete_cache_key, delete_cache_namespace, delete_cache_prefix, flushdb, \
+    get_cache_namespace_stats
 from ripley.lib.http import tolerant_jsonify
 
 
@@ -43,8 +45,23 @@ def delete_key(key):
     return tolerant_jsonify({'deleted': True})
 
 
+@app.route('/api/cache/delete_namespace/<name>')
+@admin_required
+def delete_namespace(name):
+    if name not in CACHE_NAMESPACES:
+        raise ResourceNotFoundError(f'Unknown cache namespace: {name}')
+    deleted_count = delete_cache_namespace(name)
+    return tolerant_jsonify({'deleted': True, 'count': deleted_count})
+
+
 @app.route('/api/cache/delete_prefix/<prefix>')
 @admin_required
 def delete_prefix(prefix):
-    delete_cache_prefix(prefix)
-    return tolerant_jsonify({'deleted': True})
+    deleted_count = delete_cache_prefix(prefix)
+    return tolerant_jsonify({'deleted': True, 'count': deleted_count})
+
+
+@app.route('/api/cache/namespaces')
+@admin_required
+def get_namespaces():
+    return tolerant_jsonify(get_cache_namespace_stats())
@@ -29,7 +29,7 @@ from flask_login import current_user
 from ripley.api.errors import BadRequestError, InternalServerError
 from ripley.api.util import canvas_role_required, csv_download_response
 from ripley.externals import canvas
-from ripley.externals.canvas import get_course_sections
+from ripley.externals.canvas import get_cached_course_sections
 from ripley.externals.redis import cache_dict_object, enqueue, fetch_cached_dict_object, get_job
 from ripley.lib.berkeley_term import BerkeleyTerm
 from ripley.lib.canvas_site_utils import get_official_sections, parse_canvas_sis_section_id
@@ -87,7 +87,7 @@ def is_official_canvas_course(canvas_site_id):
     if not api_json:
         is_official_course = False
         oldest_official_term = app.config['CANVAS_OLDEST_OFFICIAL_TERM']
-        for canvas_section in get_course_sections(canvas_site_id):
+        for canvas_section in get_cached_course_sections(canvas_site_id):
             section_id, berkeley_term = parse_canvas_sis_section_id(canvas_section.sis_section_id)
             if berkeley_term:
                 sis_term_id = berkeley_term.to_sis_term_id()
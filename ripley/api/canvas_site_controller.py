@@ -201,7 +201,7 @@ def edit_sections(canvas_site_id):
 @canvas_role_required(*ROLES_CAN_VIEW_OFFICIAL_SECTIONS)
 @hypersleep_disabled
 def get_official_course_sections(canvas_site_id):
-    course = canvas.get_course(canvas_site_id)
+    course = canvas.get_cached_course(canvas_site_id)
     if course:
         canvas_site_user = canvas.get_course_user(canvas_site_id, current_user.canvas_user_id)
         enrollments = canvas_site_user.enrollments if canvas_site_user and canvas_site_user.enrollments else []
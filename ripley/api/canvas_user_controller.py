@@ -36,10 +36,10 @@ from ripley.lib.http import tolerant_jsonify
 @app.route('/api/canvas_user/<canvas_site_id>/options')
 @canvas_role_required('Lead TA', 'Maintainer', 'Owner', 'TaEnrollment', 'TeacherEnrollment', 'CanvasAdmin')
 def get_add_user_options(canvas_site_id):
-    course = canvas.get_course(canvas_site_id)
+    course = canvas.get_cached_course(canvas_site_id)
     if not course:
         raise ResourceNotFoundError(f'No Canvas course site found with ID {canvas_site_id}.')
-    course_sections = canvas.get_course_sections(canvas_site_id)
+    course_sections = canvas.get_cached_course_sections(canvas_site_id)
     return tolerant_jsonify({
         'courseSections': [{'id': section.id, 'name': section.name} for section in course_sections],
         'grantingRoles': _get_grantable_roles(course.account_id),
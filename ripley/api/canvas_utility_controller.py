@@ -28,7 +28,7 @@ from flask import current_app as app, request
 from flask_login import current_user, login_required
 from ripley.api.errors import BadRequestError, InternalServerError
 from ripley.externals import canvas
-from ripley.externals.redis import cache_dict_object, fetch_cached_dict_object
+from ripley.externals.redis import fetch_or_fill_cached_dict_object
 from ripley.lib.canvas_user_utils import import_users
 from ripley.lib.http import tolerant_jsonify
 from ripley.models.user import User
@@ -37,16 +37,20 @@ from ripley.models.user import User
 @app.route('/api/canvas/external_tools')
 def get_external_tools():
     # Used by canvas-customization.js
-    cache_key = 'canvas_external_tools'
-    api_json = fetch_cached_dict_object(cache_key)
-    if not api_json:
-        def _get_external_tools(account_id):
-            return {tool.name: tool.id for tool in canvas.get_external_tools('account', account_id)}
-        api_json = {
+    def _get_external_tools(account_id):
+        return {tool.name: tool.id for tool in canvas.get_external_tools('account', account_id)}
+
+    def _get_api_json():
+        return {
             'globalTools': _get_external_tools(app.config['CANVAS_BERKELEY_ACCOUNT_ID']),
             'officialCourseTools': _get_external_tools(app.config['CANVAS_COURSES_ACCOUNT_ID']),
         }
-        cache_dict_object(cache_key, api_json, app.config['EXTERNAL_TOOLS_CACHE_EXPIRES_IN_SECONDS'])
+    api_json = fetch_or_fill_cached_dict_object(
+        'canvas_external_tools',
+        _get_api_json,
+        app.config['EXTERNAL_TOOLS_CACHE_EXPIRES_IN_SECONDS'],
+        stale_seconds=app.config['EXTERNAL_TOOLS_CACHE_STALE_SECONDS'],
+    )
     return tolerant_jsonify(api_json)
 
 
@@ -29,7 +29,7 @@ from ripley.api.errors import ResourceNotFoundError, UnauthorizedRequestError
 from ripley.api.util import canvas_role_required
 from ripley.externals import canvas
 from ripley.externals.data_loch import find_course_by_name, get_section_instructors
-from ripley.externals.redis import cache_dict_object, fetch_cached_dict_object
+from ripley.externals.redis import fetch_or_fill_cached_dict_object
 from ripley.lib.berkeley_term import BerkeleyTerm
 from ripley.lib.canvas_site_utils import canvas_section_to_api_json, canvas_site_to_api_json, \
     parse_canvas_sis_course_id
@@ -44,8 +44,7 @@ def get_grade_distribution(canvas_site_id):
     course, course_name, section_ids, term = _validate(canvas_site_id, instructor_uid)
     cache_key = f'grade_distribution/{canvas_site_id}/{instructor_uid}'
 
-    distribution = fetch_cached_dict_object(cache_key)
-    if not distribution:
+    def _get_distribution():
         distribution = {
             'canvasSite': canvas_site_to_api_json(course),
             'courseName': course_name,
@@ -75,11 +74,16 @@ def get_grade_distribution(canvas_site_id):
                     'id': term_id,
                     'name': BerkeleyTerm.from_sis_term_id(term_id).to_english(),
                 })
-
-            cache_dict_object(cache_key, distribution, app.config['GRADE_DISTRIBUTION_CACHE_EXPIRES_IN_DAYS'] * 86400)
+            return distribution
         else:
             _handle_error()
 
+    distribution = fetch_or_fill_cached_dict_object(
+        cache_key,
+        _get_distribution,
+        app.config['GRADE_DISTRIBUTION_CACHE_EXPIRES_IN_DAYS'] * 86400,
+        stale_seconds=app.config['GRADE_DISTRIBUTION_CACHE_STALE_SECONDS'],
+    )
     return tolerant_jsonify(distribution)
 
 
@@ -91,18 +95,20 @@ def get_prior_enrollment_grade_distribution(canvas_site_id):
     prior_course_name = request.args.get('prior')
     cache_key = f'grade_distribution/{canvas_site_id}/{instructor_uid}/{prior_course_name}'
 
-    distribution = fetch_cached_dict_object(cache_key)
-    if not distribution:
-        course = canvas.get_course(canvas_site_id)
-        course_name, term = parse_canvas_sis_course_id(course.sis_course_id)
-        distribution = get_grade_distribution_with_prior_enrollments(
+    def _get_distribution():
+        return get_grade_distribution_with_prior_enrollments(
             term_id=term.to_sis_term_id(),
             course_name=course_name,
             prior_course_name=prior_course_name,
             instructor_uid=instructor_uid,
         )
-        cache_dict_object(cache_key, distribution, app.config['GRADE_DISTRIBUTION_CACHE_EXPIRES_IN_DAYS'] * 86400)
 
+    distribution = fetch_or_fill_cached_dict_object(
+        cache_key,
+        _get_distribution,
+        app.config['GRADE_DISTRIBUTION_CACHE_EXPIRES_IN_DAYS'] * 86400,
+        stale_seconds=app.config['GRADE_DISTRIBUTION_CACHE_STALE_SECONDS'],
+    )
     return tolerant_jsonify(distribution)
 
 
@@ -115,7 +121,7 @@ def search_courses():
 
 
 def _validate(canvas_site_id, instructor_uid):
-    course = canvas.get_course(canvas_site_id)
+    course = canvas.get_cached_course(canvas_site_id)
     if not course:
         raise ResourceNotFoundError('Course site not found.')
     course_name, term = parse_canvas_sis_course_id(course.sis_course_id)
@@ -123,7 +129,7 @@ def _validate(canvas_site_id, instructor_uid):
         warning = 'No SIS course found for this course site'
         app.logger.warning(f'{warning} (id={canvas_site_id}, name={course.name}, sis_course_id={course.sis_course_id}).')
         raise ResourceNotFoundError(warning)
-    canvas_sections = canvas.get_course_sections(canvas_site_id) or []
+    canvas_sections = canvas.get_cached_course_sections(canvas_site_id) or []
     sis_sections = [canvas_section_to_api_json(cs) for cs in canvas_sections if cs.sis_section_id]
     if len(sis_sections) == 0:
         warning = 'No official sections found for this course site'
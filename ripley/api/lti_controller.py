@@ -245,7 +245,7 @@ def _launch_tool(target_uri):
             uid=uid,
             canvas_masquerading_user_id=canvas_masquerading_user_id,
         )
-        user = User(user_id)
+        user = User(user_id, refresh=True)
         if start_login_session(user):
             app.logger.info(f'Logged in during LTI launch as {masquerading}({str(user)})')
             return redirect(f'/{target_uri}')
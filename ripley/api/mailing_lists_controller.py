@@ -125,7 +125,7 @@ def update_welcome_email():
 @app.route('/api/mailing_list/suggested_name/<canvas_site_id>')
 @canvas_role_required('TeacherEnrollment', 'TaEnrollment', 'Lead TA', 'Reader', 'CanvasAdmin')
 def get_suggested_mailing_list_name(canvas_site_id):
-    canvas_site = canvas.get_course(canvas_site_id)
+    canvas_site = canvas.get_cached_course(canvas_site_id)
     if canvas_site:
         name, suffix = MailingList.get_suggested_name(canvas_site)
         return tolerant_jsonify({
@@ -176,7 +176,7 @@ def populate_mailing_lists(mailing_list_id):
 
 
 def _mailing_list(canvas_site_id):
-    course = canvas.get_course(canvas_site_id)
+    course = canvas.get_cached_course(canvas_site_id)
     if course:
         mailing_list = MailingList.find_by_canvas_site_id(canvas_site_id) if course else None
         return tolerant_jsonify(mailing_list.to_api_json() if mailing_list else None)
@@ -33,7 +33,7 @@ from ripley.externals import data_loch
 from ripley.externals.b_connected import BConnected
 from ripley.externals.canvas import ping_canvas
 from ripley.externals.rds import log_db_error
-from ripley.externals.redis import redis_ping, redis_status
+from ripley.externals.redis import get_cache_stats, redis_ping, redis_status
 from ripley.lib.calnet_utils import get_calnet_user_for_uid
 from ripley.lib.http import tolerant_jsonify
 from ripley.lib.util import utc_now
@@ -87,6 +87,18 @@ def ping():
         )
 
 
+@app.route('/api/ping/cache')
+@admin_required
+def cache_stats():
+    return tolerant_jsonify(get_cache_stats())
+
+
+@app.route('/api/ping/data_loch')
+@admin_required
+def data_loch_stats():
+    return tolerant_jsonify(data_loch.get_query_stats())
+
+
 @app.route('/api/ping/rq')
 @admin_required
 def rq_status():
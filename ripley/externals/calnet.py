@@ -23,6 +23,10 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+import time
+
 from bonsai import LDAPClient
 from bonsai.errors import ConnectionError as BonsaiConnectionError, LDAPError
 from bonsai.pool import ThreadedConnectionPool
@@ -43,7 +47,13 @@ SCHEMA_DICT = {
     'uid': 'uid',
 }
 
-BATCH_QUERY_MAXIMUM = 20
+BATCH_QUERY_INITIAL = 20
+BATCH_QUERY_MINIMUM = 5
+BATCH_QUERY_MAXIMUM = 100
+
+# UIDs per search filter, adapted to observed LDAP latency and shared by all searches in this process.
+batch_query_size = BATCH_QUERY_INITIAL
+batch_query_size_lock = Lock()
 
 
 def client(app):
@@ -77,21 +87,51 @@ class Client:
 
     def search_uids(self, uids, search_base=None, use_fallback_mail=False):
         from flask import current_app as app
+        if len(uids) == 1:
+            app.logger.debug(f'Executing LDAP search (UID {uids[0]})')
+            return self._search_uids_batch(uids, search_base, use_fallback_mail)[0] or []
+        flask_app = app._get_current_object()
+        max_workers = app.config['LDAP_POOL_SIZE_MAX']
+
+        def _search_batch(uids_batch):
+            with flask_app.app_context():
+                return self._search_uids_batch(uids_batch, search_base, use_fallback_mail)
+
         all_out = []
-        for i in range(0, len(uids), BATCH_QUERY_MAXIMUM):
-            if len(uids) == 1:
-                app.logger.debug(f'Executing LDAP search (UID {uids[0]})')
-            else:
-                app.logger.debug(f'Executing LDAP UID search ({i+1} to {min(len(uids), i+BATCH_QUERY_MAXIMUM)} of {len(uids)})')
-            uids_batch = uids[i:i + BATCH_QUERY_MAXIMUM]
-            try:
-                _filter = _ldap_search_filter({'uid': uids_batch}, search_base)
-                all_out += self._search(_filter, search_base, use_fallback_mail=use_fallback_mail)
-            except Exception as e:
-                app.logger.error('LDAP UID search query failed')
-                app.logger.exception(e)
+        remaining_uids = list(uids)
+        searched_count = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            while remaining_uids or pending:
+                while remaining_uids and len(pending) < max_workers:
+                    uids_batch = remaining_uids[0:batch_query_size]
+                    del remaining_uids[0:len(uids_batch)]
+                    pending[executor.submit(_search_batch, uids_batch)] = uids_batch
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    uids_batch = pending.pop(future)
+                    results, elapsed = future.result()
+                    _adapt_batch_query_size(len(uids_batch), elapsed, failed=results is None)
+                    if results is not None:
+                        all_out += results
+                        searched_count += len(uids_batch)
+                        app.logger.debug(f'Executed LDAP UID search ({searched_count} of {len(uids)})')
+                    elif len(uids_batch) > batch_query_size:
+                        # Retry a failed batch in smaller pieces.
+                        remaining_uids += uids_batch
         return all_out
 
+    def _search_uids_batch(self, uids_batch, search_base, use_fallback_mail):
+        from flask import current_app as app
+        start = time.monotonic()
+        try:
+            _filter = _ldap_search_filter({'uid': uids_batch}, search_base)
+            return self._search(_filter, search_base, use_fallback_mail=use_fallback_mail), time.monotonic() - start
+        except Exception as e:
+            app.logger.error(f'LDAP UID search query failed ({len(uids_batch)} UIDs)')
+            app.logger.exception(e)
+            return None, time.monotonic() - start
+
     def _search(self, search_filter, search_base=None, use_fallback_mail=False):
         from flask import current_app as app
         idle_count = ldap_connection_pool.idle_connection
@@ -114,6 +154,17 @@ class Client:
                         raise
 
 
+def _adapt_batch_query_size(batch_size, elapsed, failed=False):
+    from flask import current_app as app
+    global batch_query_size
+    target_seconds = app.config['LDAP_BATCH_TARGET_SECONDS']
+    with batch_query_size_lock:
+        if failed or elapsed > target_seconds:
+            batch_query_size = max(BATCH_QUERY_MINIMUM, min(batch_query_size, batch_size) // 2)
+        elif elapsed < target_seconds / 2 and batch_size >= batch_query_size:
+            batch_query_size = min(BATCH_QUERY_MAXIMUM, batch_query_size + batch_query_size // 2)
+
+
 def _attributes_to_dict(entry, search_base, use_fallback_mail=False):
     out = dict.fromkeys(SCHEMA_DICT.values(), None)
     if search_base == 'expired':
@@ -23,11 +23,17 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import csv
+import gzip
+import hashlib
 import io
 import json
 import os
-from time import sleep
+from threading import Condition, local, Lock
+from time import monotonic, sleep
 from urllib.parse import urljoin
 
 from canvasapi import Canvas
@@ -39,13 +45,133 @@ from canvasapi.sis_import import SisImport
 from canvasapi.tab import Tab
 from canvasapi.user import User
 from flask import current_app as app
+from ripley.externals.redis import delete_cache_key, fetch_or_fill_cached_dict_object
 from ripley.lib import http
+from ripley.lib.util import clear_request_memo, request_memoized
 
 # By default, we allow up to an hour for Canvas to rouse itself.
 BACKGROUND_STATUS_CHECK_INTERVAL = 20
 MAX_REPORT_RETRIEVAL_ATTEMPTS = 180
+REPORT_POLL_INITIAL_SECONDS = 5
+REPORT_POLL_MAX_SECONDS = 60
 MAX_SIS_IMPORT_ATTEMPTS = 180
 
+# Report attachments are streamed in chunks of this size rather than read into memory.
+REPORT_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Cached parts of a course site's context, each under canvas_course_context:<site id>:<part>.
+COURSE_CONTEXT_PARTS = ('course', 'sections')
+
+ReportDownload = namedtuple('ReportDownload', ['path', 'sha256', 'size', 'compressed'])
+
+# Canvas clients are shared per base URL so that their underlying requests.Session keeps connections alive.
+canvas_clients = {}
+canvas_clients_lock = Lock()
+
+# Canvas meters API usage with a leaky bucket (about 700 units), reported back in X-Rate-Limit-Remaining. Concurrent
+# fetches shrink as the bucket drains and grow again as it refills. Each fetch_concurrently call has its own throttle,
+# seen by the shared sessions' response hook only on that call's worker threads; other callers, web requests among them,
+# are never held up or retried by it.
+RATE_LIMIT_HIGH_WATER = 400
+RATE_LIMIT_LOW_WATER = 150
+THROTTLE_BACKOFF_INITIAL_SECONDS = 2
+THROTTLE_BACKOFF_MAX_SECONDS = 60
+MAX_THROTTLE_RETRIES = 5
+
+
+class CanvasThrottle:
+
+    def __init__(self):
+        self.active = 0
+        self.backoff_seconds = 0
+        self.condition = Condition()
+        self.limit = None
+        self.max_limit = None
+        self.resume_at = 0
+
+    def configure(self, max_workers):
+        with self.condition:
+            self.max_limit = max_workers
+            self.limit = max_workers
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        with self.condition:
+            while self.active >= (self.limit or 1) or monotonic() < self.resume_at:
+                self.condition.wait(timeout=max(self.resume_at - monotonic(), 0.1))
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+    def on_response(self, response, *args, **kwargs):
+        attempts = 0
+        while _is_throttled(response) and attempts < MAX_THROTTLE_RETRIES:
+            attempts += 1
+            delay = self._back_off()
+            app.logger.warning(f'Canvas throttled request ({response.request.method} {response.request.url}), retrying in {delay} seconds')
+            sleep(delay)
+            response = response.connection.send(response.request, **kwargs)
+        self._observe(response)
+        return response
+
+    def _back_off(self):
+        with self.condition:
+            self.backoff_seconds = min(max(self.backoff_seconds * 2, THROTTLE_BACKOFF_INITIAL_SECONDS), THROTTLE_BACKOFF_MAX_SECONDS)
+            self.resume_at = max(self.resume_at, monotonic() + self.backoff_seconds)
+            if self.limit:
+                self.limit = max(1, self.limit // 2)
+            return self.backoff_seconds
+
+    def _observe(self, response):
+        remaining = _header_as_float(response, 'X-Rate-Limit-Remaining')
+        if remaining is None or _is_throttled(response):
+            return
+        cost = _header_as_float(response, 'X-Request-Cost') or 1.0
+        with self.condition:
+            self.backoff_seconds = 0
+            if not self.limit:
+                return
+            if remaining < RATE_LIMIT_LOW_WATER or remaining < cost * self.active:
+                self.limit = max(1, self.limit // 2)
+            elif remaining < RATE_LIMIT_HIGH_WATER:
+                self.limit = max(1, self.limit - 1)
+            elif self.limit < self.max_limit:
+                self.limit += 1
+                self.condition.notify_all()
+
+
+canvas_throttle_context = local()
+
+
+class ReportRows:
+    # Rows of a CSV report streamed from Canvas, as dicts. The download holds a pooled connection of the shared session,
+    # released once the rows are read to the end, when iteration stops early, or on close(). Callers that may not iterate
+    # at all should use it as a context manager.
+
+    def __init__(self, response):
+        self.response = response
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        try:
+            self.response.raw.decode_content = True
+            yield from csv.DictReader(io.TextIOWrapper(self.response.raw, encoding='utf-8', newline=''))
+        finally:
+            self.close()
+
+    def close(self):
+        self.response.close()
+
 
 def ping_canvas():
     return get_account(app.config['CANVAS_BERKELEY_ACCOUNT_ID']) is not None
@@ -133,6 +259,41 @@ def edit_external_tool(tool, tool_settings):
     return tools
 
 
+def fetch_concurrently(func, items, max_workers=None, errors=None):
+    """Apply func to each item on a bounded thread pool, yielding (item, result) pairs in input order.
+
+    Concurrency adapts to the Canvas rate-limit headers seen on responses, and throttled (403) requests are retried
+    after a backoff shared by all workers. An item for which func raises is logged and skipped, and if an errors list is
+    given, (item, exception) is appended to it.
+    """
+    items = list(items)
+    if not items:
+        return
+    max_workers = max_workers or app.config['CANVAS_FETCH_MAX_WORKERS']
+    throttle = CanvasThrottle()
+    throttle.configure(max_workers)
+    flask_app = app._get_current_object()
+
+    def _fetch(item):
+        with flask_app.app_context(), throttle.slot():
+            canvas_throttle_context.throttle = throttle
+            try:
+                return func(item), None
+            except Exception as e:
+                app.logger.error(f'Concurrent Canvas fetch failed for {item}')
+                app.logger.exception(e)
+                return None, e
+            finally:
+                canvas_throttle_context.throttle = None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item, (result, error) in zip(items, executor.map(_fetch, items)):
+            if error is None:
+                yield item, result
+            elif errors is not None:
+                errors.append((item, error))
+
+
 def get_account(account_id, api_call=True, api_url=None, use_sis_id=False):
     c = _get_canvas(api_url)
     if api_call is False:
@@ -167,6 +328,29 @@ def get_communication_channels(canvas_user_id):
         app.logger.exception(e)
 
 
+@request_memoized
+def get_cached_course(canvas_site_id):
+    # Course (with term) shared across requests for CANVAS_COURSE_CONTEXT_CACHE_EXPIRES_IN_SECONDS. Do not use it to
+    # decide on changes to the site; see invalidate_course_context.
+    def _get_course_attributes():
+        course = get_course(canvas_site_id)
+        return course and _canvas_object_attributes(course)
+    attributes = _fetch_course_context(canvas_site_id, 'course', _get_course_attributes)
+    return attributes and Course(_get_canvas()._Canvas__requester, attributes)
+
+
+@request_memoized
+def get_cached_course_sections(canvas_site_id):
+    def _get_sections_attributes():
+        sections = get_course_sections(canvas_site_id)
+        return None if sections is None else {'sections': [_canvas_object_attributes(s) for s in sections]}
+    attributes = _fetch_course_context(canvas_site_id, 'sections', _get_sections_attributes)
+    if attributes is None:
+        return None
+    requester = _get_canvas()._Canvas__requester
+    return [Section(requester, section) for section in attributes['sections']]
+
+
 def get_course(course_id, api_call=True, use_sis_id=False, log_not_found=True, include_deleted=False):
     c = _get_canvas()
     if api_call is False:
@@ -202,6 +386,7 @@ def get_course_settings(course_id):
         app.logger.exception(e)
 
 
+@request_memoized
 def get_course_user(course_id, user_id):
     try:
         return get_course(course_id, api_call=False).get_user(user_id, include='enrollments')
@@ -209,45 +394,68 @@ def get_course_user(course_id, user_id):
         app.logger.error(f'Failed to retrieve Canvas course user (course_id={course_id}, user_id={user_id})')
 
 
-def get_csv_report(report_type, download_path=None, term_id=None):
-    canvas = _get_canvas()
-    account = canvas.get_account(app.config['CANVAS_BERKELEY_ACCOUNT_ID'])
-    parameters = {report_type: 1}
-    if term_id:
-        parameters['enrollment_term'] = f'sis_term_id:{term_id}'
-
-    r = account.create_report('provisioning_csv', parameters=parameters)
-    if not r:
-        app.logger.error(f'Failed to request CSV {report_type} report')
-        return None
+def get_csv_report(report_type, download_path=None, term_id=None, compress=False):
+    """Request a provisioning CSV report and wait for Canvas to generate it.
 
-    app.logger.info(f'Requested CSV {report_type} report: {r}')
-    attempts = 0
+    With a download_path, the report is streamed to disk (gzipped if compress=True) and a ReportDownload carrying the
+    SHA-256 checksum and byte count is returned. Otherwise, ReportRows streaming directly from Canvas are returned.
+    """
+    report_spec = {
+        'download_path': download_path,
+        'report_type': report_type,
+        'term_id': term_id,
+    }
+    for key, result in get_csv_reports({report_type: report_spec}, compress=compress):
+        return result
 
-    while attempts < MAX_REPORT_RETRIEVAL_ATTEMPTS:
-        report = account.get_report('provisioning_csv', r.id)
 
-        if report.status == 'complete':
-            file = canvas.get_file(report.attachment['id'])
-            if not download_path:
-                return csv.DictReader(io.StringIO(file.get_contents()))
-            else:
-                # We use this lower-level workaround to canvasapi's File.download in order to avoid memory-intensive
-                # logging on a large file response.
-                file_response = canvas._Canvas__requester._get_request(file.url, {})
-                with open(download_path, 'wb') as f:
-                    f.write(file_response.content)
-                return True
+def get_csv_reports(report_specs, compress=False):
+    """Request several provisioning CSV reports at once, so that Canvas generates them in parallel.
 
-        elif report.status == 'error':
-            app.logger.error(f'Failed to generate CSV {report_type} report: {report}')
-            return None
+    Report specs are dicts keyed by caller-chosen names, with 'report_type' and optional 'term_id' and 'download_path'.
+    Yields (key, result) pairs, with results as in get_csv_report, in the order reports become available. All pending
+    reports are polled together, with exponential backoff between polls.
+    """
+    canvas = _get_canvas()
+    account = canvas.get_account(app.config['CANVAS_BERKELEY_ACCOUNT_ID'])
 
+    pending = {}
+    for key, report_spec in report_specs.items():
+        report_type = report_spec['report_type']
+        parameters = {report_type: 1}
+        if report_spec.get('term_id'):
+            parameters['enrollment_term'] = f"sis_term_id:{report_spec['term_id']}"
+        r = account.create_report('provisioning_csv', parameters=parameters)
+        if r:
+            app.logger.info(f'Requested CSV {report_type} report: {r}')
+            pending[key] = (report_spec, r)
         else:
-            attempts += 1
-            sleep(BACKGROUND_STATUS_CHECK_INTERVAL)
-
-    app.logger.error(f'Failed to retrieve CSV {report_type} report after {MAX_REPORT_RETRIEVAL_ATTEMPTS} attempts')
+            app.logger.error(f'Failed to request CSV {report_type} report')
+            yield key, None
+
+    poll_interval = REPORT_POLL_INITIAL_SECONDS
+    deadline = monotonic() + MAX_REPORT_RETRIEVAL_ATTEMPTS * BACKGROUND_STATUS_CHECK_INTERVAL
+    while pending:
+        for key, (report_spec, r) in list(pending.items()):
+            report_type = report_spec['report_type']
+            report = account.get_report('provisioning_csv', r.id)
+            if report.status == 'complete':
+                del pending[key]
+                file = canvas.get_file(report.attachment['id'])
+                yield key, _stream_report_file(canvas, file, report_type, report_spec.get('download_path'), compress)
+            elif report.status == 'error':
+                del pending[key]
+                app.logger.error(f'Failed to generate CSV {report_type} report: {report}')
+                yield key, None
+        if pending:
+            if monotonic() >= deadline:
+                break
+            sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, REPORT_POLL_MAX_SECONDS)
+
+    for key, (report_spec, r) in pending.items():
+        app.logger.error(f"Failed to retrieve CSV {report_spec['report_type']} report {r.id} within the time allowed")
+        yield key, None
 
 
 def get_developer_keys():
@@ -416,6 +624,13 @@ def get_user_courses(uid):
     return courses or []
 
 
+def invalidate_course_context(canvas_site_id):
+    for part in COURSE_CONTEXT_PARTS:
+        delete_cache_key(_course_context_cache_key(canvas_site_id, part))
+    clear_request_memo(get_cached_course)
+    clear_request_memo(get_cached_course_sections)
+
+
 def post_sis_import(attachment, extension='csv'):
     c = _get_canvas()
     content_type = 'application/zip' if extension == 'zip' else 'text/csv'
@@ -467,10 +682,74 @@ def set_tab_hidden(canvas_site_id, hidden, tab_id):
     return success
 
 
+def _canvas_object_attributes(canvas_object):
+    # Undo CanvasObject.set_attributes, which adds a parsed <name>_date attribute for every date-like value.
+    attributes = {k: v for k, v in canvas_object.__dict__.items() if k != '_requester'}
+    return {k: v for k, v in attributes.items() if not (k.endswith('_date') and k[:-5] in attributes)}
+
+
+def _course_context_cache_key(canvas_site_id, part):
+    return f'canvas_course_context:{canvas_site_id}:{part}'
+
+
+def _fetch_course_context(canvas_site_id, part, fill_function):
+    return fetch_or_fill_cached_dict_object(
+        _course_context_cache_key(canvas_site_id, part),
+        fill_function,
+        app.config['CANVAS_COURSE_CONTEXT_CACHE_EXPIRES_IN_SECONDS'],
+    )
+
+
 def _get_canvas(api_url=None):
     if not api_url:
         api_url = app.config['CANVAS_API_URL']
-    return Canvas(
-        base_url=api_url,
-        access_token=app.config['CANVAS_ACCESS_TOKEN'],
-    )
+    access_token = app.config['CANVAS_ACCESS_TOKEN']
+    with canvas_clients_lock:
+        canvas = canvas_clients.get((api_url, access_token))
+        if canvas is None:
+            canvas = Canvas(
+                base_url=api_url,
+                access_token=access_token,
+            )
+            session = http.mount_pooled_adapter(canvas._Canvas__requester._session)
+            session.hooks['response'].append(_on_canvas_response)
+            canvas_clients[(api_url, access_token)] = canvas
+    return canvas
+
+
+def _stream_report_file(canvas, file, report_type, download_path=None, compress=False):
+    # We bypass canvasapi's File.download and File.get_contents, both of which hold the whole response in memory.
+    try:
+        response = canvas._Canvas__requester._session.get(file.url, stream=True)
+        response.raise_for_status()
+    except Exception as e:
+        app.logger.error(f'Failed to download CSV {report_type} report (file_id={file.id})')
+        app.logger.exception(e)
+        return None
+    if not download_path:
+        return ReportRows(response)
+    checksum = hashlib.sha256()
+    size = 0
+    with response, (gzip.open if compress else open)(download_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=REPORT_DOWNLOAD_CHUNK_SIZE):
+            checksum.update(chunk)
+            size += len(chunk)
+            f.write(chunk)
+    app.logger.info(f'Downloaded CSV {report_type} report to {download_path} ({size} bytes, sha256={checksum.hexdigest()})')
+    return ReportDownload(download_path, checksum.hexdigest(), size, compress)
+
+
+def _header_as_float(response, header):
+    try:
+        return float(response.headers[header])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _is_throttled(response):
+    return response.status_code == 403 and b'Rate Limit Exceeded' in (response.content or b'')
+
+
+def _on_canvas_response(response, *args, **kwargs):
+    throttle = getattr(canvas_throttle_context, 'throttle', None)
+    return throttle.on_response(response, *args, **kwargs) if throttle else response
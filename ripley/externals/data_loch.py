@@ -23,13 +23,21 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime
+from functools import wraps
+import json
+import sys
+from threading import BoundedSemaphore, local, Lock
+from time import monotonic
+from uuid import uuid4
 
 from flask import current_app as app
 import psycopg2
 import psycopg2.extras
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.pool import PoolError, ThreadedConnectionPool
 from ripley.lib import util
 
 COURSE_NAME_REGEX = r'([A-Z]+)\s([A-Z]?)(\d+)([A-Z]?)([A-Z]?)'
@@ -56,57 +64,153 @@ SECTION_COLUMNS = f"""
     ss.instructor_role_code,
     regexp_matches(ss.sis_course_name, '{COURSE_NAME_REGEX}') AS sort_key"""
 
+# The pool raises PoolError when exhausted rather than waiting, so callers first take one of DATA_LOCH_MAX_CONNECTIONS
+# slots, waiting up to DATA_LOCH_POOL_WAIT_SECONDS for one.
 connection_pool = None
+connection_slots = None
+
+# Public query functions are tagged with a stable name (see named_query). Per-name latency histograms, row and error
+# counts and connection-pool wait times are collected in process; queries slower than DATA_LOCH_SLOW_QUERY_SECONDS are
+# logged. Streamed queries are timed until the stream is exhausted.
+QUERY_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+query_context = local()
+query_stats = {}
+query_stats_lock = Lock()
+
+# Results of term-stable queries (named_query with cache=True) are held in process, least recently used first, for up to
+# DATA_LOCH_QUERY_CACHE_SECONDS and DATA_LOCH_QUERY_CACHE_MAX_ENTRIES. The whole cache is dropped when the loch's SIS
+# refresh timestamp changes, which is checked at most every DATA_LOCH_REFRESH_CHECK_SECONDS.
+query_cache = OrderedDict()
+query_cache_lock = Lock()
+query_cache_state = {
+    'checked_at': None,
+    'generation': 0,
+    'refreshed_at': None,
+}
+
+
+class BasicAttributesRow:
+    # Bulk user queries hold one of these per campus user. Only the columns that user provisioning needs are kept, in
+    # a tuple rather than a dict, and the heavily repeated affiliations and person_type strings are interned. Like the
+    # dict rows returned elsewhere, columns are read by key only; they are not attributes.
+    columns = ('ldap_uid', 'sid', 'first_name', 'last_name', 'email_address', 'affiliations', 'person_type')
+    column_indexes = {column: index for index, column in enumerate(columns)}
+    interned_columns = ('affiliations', 'person_type')
+    __slots__ = ('_values',)
+
+    def __init__(self, row):
+        self._values = tuple(_intern(row[c]) if c in self.interned_columns else row[c] for c in self.columns)
+
+    def __contains__(self, key):
+        return key in self.column_indexes
+
+    def __eq__(self, other):
+        return dict(self) == (dict(other) if isinstance(other, BasicAttributesRow) else other)
+
+    def __getitem__(self, key):
+        return self._values[self.column_indexes[key]]
+
+    def __repr__(self):
+        return f'<BasicAttributesRow {dict(self)}>'
+
+    def get(self, key, default=None):
+        index = self.column_indexes.get(key)
+        return default if index is None else self._values[index]
+
+    def keys(self):
+        return list(self.columns)
+
+
+def named_query(query_name, cache=False):
+    def _named_query(func):
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            with _query_name(query_name):
+                if cache and app.config['DATA_LOCH_QUERY_CACHE_SECONDS']:
+                    return _fetch_or_fill_query_cache(query_name, func, args, kwargs)
+                return func(*args, **kwargs)
+        return _wrapper
+    return _named_query
+
+
+def get_query_stats():
+    with query_stats_lock:
+        stats = {name: {**counters, 'histogram': dict(counters['histogram'])} for name, counters in query_stats.items()}
+    for counters in stats.values():
+        counters['averageSeconds'] = counters['totalSeconds'] / counters['count'] if counters['count'] else None
+    return stats
 
 
 def safe_execute_rds(string, **kwargs):
-    global connection_pool
-    if connection_pool is None:
-        connection_pool = ThreadedConnectionPool(1, app.config['DATA_LOCH_MAX_CONNECTIONS'], app.config['DATA_LOCH_RDS_URI'])
-    with cursor_from_pool() as cursor:
-        return _safe_execute(string, cursor, **kwargs)
+    _initialize_connection_pool()
+    query_name = _current_query_name()
+    with cursor_from_pool(query_name=query_name) as cursor:
+        return _safe_execute(string, cursor, query_name, **kwargs)
+
+
+def stream_rds(string, itersize=None, row_type=dict, **kwargs):
+    # Rows come from a server-side (named) cursor, fetched itersize at a time and yielded one by one, so that large result
+    # sets are never held in memory whole. The pooled connection is returned once the generator is exhausted or closed.
+    # Each row is passed through row_type, e.g. BasicAttributesRow, on its way out.
+    return _stream(string, itersize, row_type, _current_query_name(), kwargs)
 
 
 @contextmanager
-def cursor_from_pool():
+def cursor_from_pool(name=None, query_name=None):
+    query_name = query_name or _current_query_name()
+    started_at = monotonic()
+    if not connection_slots.acquire(timeout=app.config['DATA_LOCH_POOL_WAIT_SECONDS']):
+        _record_query_stats(query_name, errors=1)
+        raise PoolError(f'Timed out waiting for a data loch connection (query {query_name})')
+    connection = None
     try:
         connection = connection_pool.getconn()
-        yield connection.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        _record_query_stats(query_name, poolWaitSeconds=monotonic() - started_at)
+        yield connection.cursor(name=name, cursor_factory=psycopg2.extras.DictCursor)
     finally:
-        connection_pool.putconn(connection)
+        if connection is not None:
+            connection_pool.putconn(connection)
+        connection_slots.release()
 
 
-# Query to identify new users for adding to bCourses, scoped to active users only.
+# Query to identify new users for adding to bCourses, scoped to active users only. Rows are streamed.
+@named_query('get_all_active_users')
 def get_all_active_users():
     # Beware CLC-7157 (the occasional active user with an 'A' person type).
-    sql = f"""SELECT * FROM sis_data.{_basic_attributes_table()}
+    sql = f"""SELECT {', '.join(BasicAttributesRow.columns)} FROM sis_data.{_basic_attributes_table()}
         WHERE (affiliations LIKE '%-TYPE-%' AND affiliations NOT LIKE '%TYPE-SPA%')
         AND (person_type != 'A' OR affiliations LIKE '%-TYPE-REGISTERED%')"""
-    return safe_execute_rds(sql)
+    return stream_rds(sql, row_type=BasicAttributesRow)
 
 
 # Query to retrieve user data for maintenance within bCourses, more broadly scoped to
 # include inactive users.
+@named_query('get_users')
 def get_users(uids=None):
     if uids is None:
-        uids_sql_fragment = ''
-    elif len(uids) == 0:
-        return []
-    else:
-        uids_sql_fragment = "WHERE ldap_uid IN ('" + "', '".join(uids) + "')"
-    sql = f"""
-        SELECT * FROM sis_data.{_basic_attributes_table()}
-        {uids_sql_fragment}
-    """
-    return safe_execute_rds(sql)
+        return safe_execute_rds(_users_sql())
+    return _get_users_in_uid_chunks(uids)
 
 
+# As above, but rows come back as BasicAttributesRow, and are streamed when the whole campus is read. A failed lookup by
+# UID returns None, as get_users does.
+@named_query('stream_users')
+def stream_users(uids=None):
+    columns = BasicAttributesRow.columns
+    if uids is None:
+        return stream_rds(_users_sql(columns=columns), row_type=BasicAttributesRow)
+    rows = _get_users_in_uid_chunks(uids, columns=columns)
+    return None if rows is None else (BasicAttributesRow(r) for r in rows)
+
+
+@named_query('get_current_term')
 def get_current_term():
     params = {'today': util.local_today()}
     rows = safe_execute_rds('SELECT * FROM terms.term_definitions WHERE term_ends >= %(today)s ORDER BY term_ends LIMIT 1', **params)
     return None if not rows or (len(rows) == 0) else rows[0]
 
 
+@named_query('get_instructing_sections', cache=True)
 def get_instructing_sections(uid, term_ids):
     params = {
         'instructor_uid': uid,
@@ -152,6 +256,7 @@ def get_instructing_sections(uid, term_ids):
     return safe_execute_rds(sql, **params)
 
 
+@named_query('has_instructor_history')
 def has_instructor_history(uid, term_ids):
     params = {
         'instructor_uid': uid,
@@ -165,6 +270,7 @@ def has_instructor_history(uid, term_ids):
     return bool(result[0] and result[0]['count'] > 0)
 
 
+@named_query('get_edo_instructor_updates')
 def get_edo_instructor_updates(since_timestamp):
     params = {
         'since_timestamp': since_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
@@ -185,6 +291,7 @@ def get_edo_instructor_updates(since_timestamp):
     return safe_execute_rds(sql, **params)
 
 
+@named_query('get_edo_enrollment_updates')
 def get_edo_enrollment_updates(since_timestamp):
     params = {
         'since_timestamp': since_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
@@ -212,6 +319,7 @@ def get_edo_enrollment_updates(since_timestamp):
     return safe_execute_rds(sql, **params)
 
 
+@named_query('get_grades_with_demographics')
 def get_grades_with_demographics(term_id, section_ids, valid_grades, instructor_uid):
     params = {
         'earliest_term_id': str(app.config['CANVAS_OLDEST_OFFICIAL_TERM']),
@@ -243,6 +351,7 @@ def get_grades_with_demographics(term_id, section_ids, valid_grades, instructor_
     return safe_execute_rds(sql, **params)
 
 
+@named_query('get_basic_profile_and_grades_per_enrollments')
 def get_basic_profile_and_grades_per_enrollments(term_id, section_ids):
     params = {
         'section_ids': section_ids,
@@ -262,6 +371,7 @@ def get_basic_profile_and_grades_per_enrollments(term_id, section_ids):
     return safe_execute_rds(sql, **params)
 
 
+@named_query('get_grades_with_enrollments')
 def get_grades_with_enrollments(term_id, course_name, prior_course_name, valid_grades, instructor_uid):
     params = {
         'course_name': course_name,
@@ -299,6 +409,7 @@ def get_grades_with_enrollments(term_id, course_name, prior_course_name, valid_g
     return safe_execute_rds(sql, **params)
 
 
+@named_query('get_sections', cache=True)
 def get_sections(term_id, section_ids):
     params = {
         'section_ids': section_ids,
@@ -312,6 +423,7 @@ def get_sections(term_id, section_ids):
     return safe_execute_rds(sql, **params)
 
 
+@named_query('get_sections_count')
 def get_sections_count(term_id):
     params = {
         'term_id': str(term_id),
@@ -323,56 +435,29 @@ def get_sections_count(term_id):
     return result and result[0]['count']
 
 
+@named_query('get_section_enrollments')
 def get_section_enrollments(term_id, section_ids, include_dropped=True):
-    params = {
-        'term_id': term_id,
-        'section_ids': section_ids,
-    }
-    drop_clause = ''
-    if not include_dropped:
-        drop_clause = """AND se.sis_enrollment_status != 'D' AND
-        CASE se.grading_basis WHEN 'NON' THEN (
-        SELECT MIN(prim_enr.grade)
-          FROM sis_data.edo_sections sec
-          LEFT JOIN sis_data.edo_enrollments prim_enr
-            ON prim_enr.sis_section_id = sec.primary_associated_section_id
-            AND prim_enr.sis_term_id = se.sis_term_id
-            AND prim_enr.ldap_uid = se.ldap_uid
-            AND prim_enr.sis_enrollment_status != 'D'
-          WHERE sec.sis_section_id = se.sis_section_id
-            AND sec.sis_term_id = se.sis_term_id
-            AND prim_enr.ldap_uid IS NOT NULL
-        )
-        ELSE se.grade END IS DISTINCT FROM 'W'"""
-    sql = f"""SELECT se.sis_section_id AS section_id, se.ldap_uid, ba.sid, ba.first_name, ba.last_name,
-            se.sis_enrollment_status, ba.email_address
-        FROM sis_data.edo_enrollments se
-        JOIN sis_data.{_basic_attributes_table()} ba on ba.ldap_uid = se.ldap_uid
-        WHERE se.sis_section_id = ANY(%(section_ids)s) {drop_clause}
-        AND se.sis_term_id = %(term_id)s
-        ORDER BY se.sis_section_id, ba.last_name, ba.first_name, se.ldap_uid"""
-    return safe_execute_rds(sql, **params)
+    return _get_enrollments(term_id, section_ids=section_ids, include_dropped=include_dropped)
 
 
+@named_query('get_section_instructors', cache=True)
 def get_section_instructors(term_id, section_ids, instructor_uid=None, roles=None):
-    params = {
-        'term_id': term_id,
-        'section_ids': section_ids,
-    }
-    if instructor_uid:
-        params['instructor_uid'] = instructor_uid
-    if roles:
-        params['roles'] = roles
-    sql = f"""SELECT DISTINCT sis_section_id, instructor_uid, instructor_name, instructor_role_code
-        FROM sis_data.edo_sections
-        WHERE sis_section_id = ANY(%(section_ids)s)
-        AND sis_term_id = %(term_id)s
-        {'AND instructor_uid = %(instructor_uid)s' if instructor_uid else ''}
-        {'AND instructor_role_code = ANY(%(roles)s)' if roles else ''}
-        ORDER BY sis_section_id, instructor_uid, instructor_name"""
-    return safe_execute_rds(sql, **params)
+    return _get_instructors(term_id, section_ids=section_ids, instructor_uid=instructor_uid, roles=roles)
+
 
+# Term-wide variants of the section queries above, used by bulk refresh jobs to avoid per-section round trips. With
+# stream=True, rows are yielded from a server-side cursor rather than returned as a list.
+@named_query('get_term_enrollments')
+def get_term_enrollments(term_id, include_dropped=True, stream=False):
+    return _get_enrollments(term_id, include_dropped=include_dropped, stream=stream)
 
+
+@named_query('get_term_instructors')
+def get_term_instructors(term_id, stream=False):
+    return _get_instructors(term_id, stream=stream)
+
+
+@named_query('get_student_profile')
 def get_student_profile(uid):
     params = {
         'uid': uid,
@@ -384,6 +469,7 @@ def get_student_profile(uid):
     return None if not rows or (len(rows) == 0) else rows[0]
 
 
+@named_query('get_undergraduate_term')
 def get_undergraduate_term(term_id):
     sql = f"""SELECT * FROM terms.term_definitions
               WHERE term_id = '{term_id}'
@@ -391,6 +477,7 @@ def get_undergraduate_term(term_id):
     return safe_execute_rds(sql)
 
 
+@named_query('find_course_by_name', cache=True)
 def find_course_by_name(search_string):
     params = {
         'search_string': f'{search_string.strip().upper()}%',
@@ -403,6 +490,7 @@ def find_course_by_name(search_string):
     return safe_execute_rds(sql, **params)
 
 
+@named_query('find_people_by_email')
 def find_people_by_email(search_string):
     params = {
         'email': f'%{search_string.strip().lower()}%',
@@ -418,6 +506,7 @@ def find_people_by_email(search_string):
     return safe_execute_rds(sql, **params)
 
 
+@named_query('find_people_by_name')
 def find_people_by_name(search_string):
     names = [name.strip().lower() for name in search_string.split(',')]
     names_string = ','.join(names)
@@ -435,6 +524,7 @@ def find_people_by_name(search_string):
     return safe_execute_rds(sql, **params)
 
 
+@named_query('find_person_by_uid')
 def find_person_by_uid(uid):
     params = {
         'uid': uid,
@@ -448,18 +538,231 @@ def find_person_by_uid(uid):
     return safe_execute_rds(sql, **params)
 
 
-def _safe_execute(sql, cursor, **kwargs):
+def _get_enrollments(term_id, section_ids=None, include_dropped=True, stream=False):
+    params = {
+        'term_id': term_id,
+    }
+    if section_ids is not None:
+        params['section_ids'] = section_ids
+    drop_clause = ''
+    if not include_dropped:
+        drop_clause = """AND se.sis_enrollment_status != 'D' AND
+        CASE se.grading_basis WHEN 'NON' THEN (
+        SELECT MIN(prim_enr.grade)
+          FROM sis_data.edo_sections sec
+          LEFT JOIN sis_data.edo_enrollments prim_enr
+            ON prim_enr.sis_section_id = sec.primary_associated_section_id
+            AND prim_enr.sis_term_id = se.sis_term_id
+            AND prim_enr.ldap_uid = se.ldap_uid
+            AND prim_enr.sis_enrollment_status != 'D'
+          WHERE sec.sis_section_id = se.sis_section_id
+            AND sec.sis_term_id = se.sis_term_id
+            AND prim_enr.ldap_uid IS NOT NULL
+        )
+        ELSE se.grade END IS DISTINCT FROM 'W'"""
+    sql = f"""SELECT se.sis_section_id AS section_id, se.ldap_uid, ba.sid, ba.first_name, ba.last_name,
+            se.sis_enrollment_status, ba.email_address
+        FROM sis_data.edo_enrollments se
+        JOIN sis_data.{_basic_attributes_table()} ba on ba.ldap_uid = se.ldap_uid
+        WHERE se.sis_term_id = %(term_id)s
+        {'AND se.sis_section_id = ANY(%(section_ids)s)' if section_ids is not None else ''} {drop_clause}
+        ORDER BY se.sis_section_id, ba.last_name, ba.first_name, se.ldap_uid"""
+    return stream_rds(sql, **params) if stream else safe_execute_rds(sql, **params)
+
+
+def _get_instructors(term_id, section_ids=None, instructor_uid=None, roles=None, stream=False):
+    params = {
+        'term_id': term_id,
+    }
+    if section_ids is not None:
+        params['section_ids'] = section_ids
+    if instructor_uid:
+        params['instructor_uid'] = instructor_uid
+    if roles:
+        params['roles'] = roles
+    sql = f"""SELECT DISTINCT sis_section_id, instructor_uid, instructor_name, instructor_role_code
+        FROM sis_data.edo_sections
+        WHERE sis_term_id = %(term_id)s
+        {'AND sis_section_id = ANY(%(section_ids)s)' if section_ids is not None else ''}
+        {'AND instructor_uid = %(instructor_uid)s' if instructor_uid else ''}
+        {'AND instructor_role_code = ANY(%(roles)s)' if roles else ''}
+        ORDER BY sis_section_id, instructor_uid, instructor_name"""
+    return stream_rds(sql, **params) if stream else safe_execute_rds(sql, **params)
+
+
+def _safe_execute(sql, cursor, query_name, **kwargs):
     try:
         ts = datetime.now().timestamp()
         cursor.execute(sql, (kwargs or None))
         query_time = datetime.now().timestamp() - ts
     except psycopg2.Error as e:
+        _record_query_stats(query_name, errors=1)
         app.logger.error(f'SQL {sql} threw {e}')
         return None
     rows = [dict(r) for r in cursor.fetchall()]
+    _record_query_timing(query_name, query_time, len(rows))
     app.logger.debug(f'Query returned {len(rows)} rows in {query_time} seconds:\n{sql}\n{kwargs}')
     return rows
 
 
+def _stream(sql, itersize, row_type, query_name, kwargs):
+    _initialize_connection_pool()
+    with cursor_from_pool(name=f'ripley_stream_{uuid4().hex}', query_name=query_name) as cursor:
+        cursor.itersize = itersize or app.config['DATA_LOCH_STREAM_ITERSIZE']
+        ts = datetime.now().timestamp()
+        row_count = 0
+        try:
+            cursor.execute(sql, (kwargs or None))
+            for row in cursor:
+                row_count += 1
+                yield row_type(row)
+        except psycopg2.Error as e:
+            _record_query_stats(query_name, errors=1)
+            app.logger.error(f'SQL {sql} threw {e}')
+            raise
+        query_time = datetime.now().timestamp() - ts
+        _record_query_timing(query_name, query_time, row_count)
+        app.logger.debug(f'Query streamed {row_count} rows in {query_time} seconds:\n{sql}\n{kwargs}')
+
+
+def _check_sis_refresh():
+    now = monotonic()
+    with query_cache_lock:
+        checked_at = query_cache_state['checked_at']
+        if checked_at is not None and now - checked_at < app.config['DATA_LOCH_REFRESH_CHECK_SECONDS']:
+            return
+        query_cache_state['checked_at'] = now
+    sql = """SELECT GREATEST(
+            (SELECT MAX(last_updated) FROM sis_data.edo_enrollment_updates),
+            (SELECT MAX(last_updated) FROM sis_data.edo_instructor_updates)
+        ) AS refreshed_at"""
+    with _query_name('sis_refreshed_at'):
+        rows = safe_execute_rds(sql)
+    refreshed_at = str(rows[0]['refreshed_at']) if rows else None
+    with query_cache_lock:
+        # If the timestamp cannot be read, nothing cached can be vouched for.
+        if refreshed_at is None or refreshed_at != query_cache_state['refreshed_at']:
+            if query_cache:
+                app.logger.info(f'Data loch SIS refresh at {refreshed_at}; dropping {len(query_cache)} cached query results')
+            query_cache.clear()
+            query_cache_state['generation'] += 1
+            query_cache_state['refreshed_at'] = refreshed_at
+
+
+def _fetch_or_fill_query_cache(query_name, func, args, kwargs):
+    _check_sis_refresh()
+    cache_key = (query_name, json.dumps([args, kwargs], default=str, sort_keys=True))
+    now = monotonic()
+    with query_cache_lock:
+        expires_at, rows = query_cache.get(cache_key, (None, None))
+        if rows is not None and expires_at > now:
+            query_cache.move_to_end(cache_key)
+        else:
+            rows = None
+        generation = query_cache_state['generation']
+    if rows is not None:
+        _record_query_stats(query_name, cacheHits=1)
+        # Callers get their own row dicts, so that they may modify them.
+        return [dict(r) for r in rows]
+    rows = func(*args, **kwargs)
+    if isinstance(rows, list):
+        with query_cache_lock:
+            if generation == query_cache_state['generation']:
+                query_cache[cache_key] = (now + app.config['DATA_LOCH_QUERY_CACHE_SECONDS'], [dict(r) for r in rows])
+                query_cache.move_to_end(cache_key)
+                while len(query_cache) > app.config['DATA_LOCH_QUERY_CACHE_MAX_ENTRIES']:
+                    query_cache.popitem(last=False)
+    return rows
+
+
+def _current_query_name():
+    return getattr(query_context, 'name', None) or 'unnamed'
+
+
+@contextmanager
+def _query_name(query_name):
+    previous_name = getattr(query_context, 'name', None)
+    query_context.name = query_name
+    try:
+        yield
+    finally:
+        query_context.name = previous_name
+
+
+def _record_query_stats(query_name, **increments):
+    with query_stats_lock:
+        counters = query_stats.get(query_name)
+        if counters is None:
+            counters = query_stats[query_name] = {
+                'cacheHits': 0,
+                'count': 0,
+                'errors': 0,
+                'histogram': {str(b): 0 for b in QUERY_LATENCY_BUCKETS + ('+Inf',)},
+                'maxSeconds': 0,
+                'poolWaitSeconds': 0,
+                'rows': 0,
+                'totalSeconds': 0,
+            }
+        for counter, increment in increments.items():
+            counters[counter] += increment
+
+
+def _record_query_timing(query_name, seconds, row_count):
+    bucket = next((str(b) for b in QUERY_LATENCY_BUCKETS if seconds <= b), '+Inf')
+    _record_query_stats(query_name, count=1, rows=row_count, totalSeconds=seconds)
+    with query_stats_lock:
+        counters = query_stats[query_name]
+        counters['histogram'][bucket] += 1
+        counters['maxSeconds'] = max(counters['maxSeconds'], seconds)
+    if seconds >= app.config['DATA_LOCH_SLOW_QUERY_SECONDS']:
+        app.logger.warning(f'Slow data loch query {query_name}: {round(seconds, 3)} seconds, {row_count} rows')
+
+
 def _basic_attributes_table():
     return app.config['DATA_LOCH_BASIC_ATTRIBUTES_TABLE']
+
+
+def _initialize_connection_pool():
+    global connection_pool, connection_slots
+    if connection_pool is None:
+        connection_slots = BoundedSemaphore(app.config['DATA_LOCH_MAX_CONNECTIONS'])
+        connection_pool = ThreadedConnectionPool(1, app.config['DATA_LOCH_MAX_CONNECTIONS'], app.config['DATA_LOCH_RDS_URI'])
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _get_users_in_uid_chunks(uids, columns=None):
+    # UIDs are bound as an array, DATA_LOCH_UID_CHUNK_SIZE at a time, so the statement text (and its plan) is the same
+    # however many are asked for. Chunks run concurrently on pooled connections, never more than the pool holds.
+    uids = list(uids)
+    if not uids:
+        return []
+    chunk_size = app.config['DATA_LOCH_UID_CHUNK_SIZE']
+    chunks = [uids[i:i + chunk_size] for i in range(0, len(uids), chunk_size)]
+    sql = _users_sql(by_uid=True, columns=columns)
+    if len(chunks) == 1:
+        return safe_execute_rds(sql, uids=chunks[0])
+
+    _initialize_connection_pool()
+    flask_app = app._get_current_object()
+    query_name = _current_query_name()
+
+    def _query(chunk):
+        with flask_app.app_context(), _query_name(query_name):
+            return safe_execute_rds(sql, uids=chunk)
+
+    max_workers = min(len(chunks), app.config['DATA_LOCH_UID_CHUNK_WORKERS'], app.config['DATA_LOCH_MAX_CONNECTIONS'])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_query, chunks))
+    if any(rows is None for rows in results):
+        return None
+    return [row for rows in results for row in rows]
+
+
+def _users_sql(by_uid=False, columns=None):
+    return f"""
+        SELECT {', '.join(columns) if columns else '*'} FROM sis_data.{_basic_attributes_table()}
+        {'WHERE ldap_uid = ANY(%(uids)s)' if by_uid else ''}
+    """
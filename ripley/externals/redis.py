@@ -22,8 +22,17 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from datetime import datetime
+from fnmatch import fnmatchcase
+from itertools import islice
 import json
+from threading import RLock
+import time
+from uuid import uuid4
+import zlib
 
 from fakeredis import FakeStrictRedis
 from flask import current_app as app
@@ -36,36 +45,168 @@ from rq.job import Job
 
 redis_conn = None
 
+# Cached objects are stored as a version byte followed by the encoded payload. Entries written before versioning are
+# plain JSON text, which never starts with one of these bytes, and are still read as such.
+CODEC_JSON = b'\x01'
+CODEC_ZLIB_JSON = b'\x02'
+CODECS = {
+    CODEC_JSON: (lambda b: b, lambda b: b),
+    CODEC_ZLIB_JSON: (lambda b: zlib.compress(b, 1), zlib.decompress),
+}
+
+FILL_WAIT_POLL_SECONDS = 0.1
+SCAN_BATCH_SIZE = 1000
+
+# Families of cache keys, by name and Redis glob pattern, for admin reporting and bulk invalidation.
+CACHE_NAMESPACES = {
+    'cache_stats': 'cache_stats:*',
+    'calnet_user': 'calnet_user_for_uid_*',
+    'canvas_admin_uids': 'canvas_admin_uids',
+    'canvas_course_context': 'canvas_course_context:*',
+    'canvas_external_tools': 'canvas_external_tools',
+    'current_terms': 'current_terms:*',
+    'egrades_export': 'egrades_export/*',
+    'fill_lock': 'fill_lock:*',
+    'grade_distribution': 'grade_distribution/*',
+    'user_profile': 'user_profile:*',
+    'user_profile_keys': 'user_profile_keys:*',
+    'user_session': 'user_session_*',
+}
+
+# Stale entries filled with background_refresh are recomputed here, off the request thread.
+CACHE_REFRESH_MAX_WORKERS = 4
+cache_refresh_executor = None
+cache_refresh_executor_lock = RLock()
+
+# Per-namespace cache counters accumulate in process and are added to Redis hashes (cache_stats:<namespace>) at most
+# every CACHE_STATS_FLUSH_SECONDS.
+CACHE_STATS_FLUSH_SECONDS = 60
+cache_stats = {}
+cache_stats_lock = RLock()
+cache_stats_flushed_at = time.monotonic()
+
+# Hot cache entries are also held in process, as {key: (expires_at, object)} in least-recently-used order. Objects are
+# copied on the way in and out, so that no caller can alter what later callers get. Writes and deletes are broadcast on
+# INVALIDATION_CHANNEL so that every other process drops its local copy.
+INVALIDATION_CHANNEL = 'ripley:cache_invalidation'
+local_cache = OrderedDict()
+local_cache_lock = RLock()
+local_cache_node_id = uuid4().hex
+# Bumped on every invalidation, so that a value read from Redis before an invalidation arrives is not cached locally.
+local_cache_generation = 0
+invalidation_listener = None
+
+
+@skip_when_pytest(mock_object=True)
+def acquire_lock(lock_key, expire_seconds, wait_seconds=0):
+    # Returns a token to pass to release_lock, or None if another caller still holds the lock after wait_seconds. The lock
+    # expires after expire_seconds in any case.
+    get_redis_conn(app)
+    lock_token = uuid4().hex
+    deadline = time.monotonic() + wait_seconds
+    while not redis_conn.set(lock_key, lock_token, nx=True, ex=expire_seconds):
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(FILL_WAIT_POLL_SECONDS)
+    return lock_token
+
 
 @skip_when_pytest()
-def cache_dict_object(cache_key, dict_object, expire_seconds=None):
+def cache_dict_object(cache_key, dict_object, expire_seconds=None, local_expire_seconds=None):
+    # local_expire_seconds, when shorter than expire_seconds, bounds the in-process copy; see fetch_or_fill_cached_dict_object.
     if type(dict_object) is dict:
         get_redis_conn(app)
-        redis_conn.set(cache_key, json.dumps(dict_object))
+        _local_cache_enabled()
+        encoded = _encode(dict_object)
+        redis_conn.set(cache_key, encoded)
+        _record_cache_stats(cache_key, writes=1, bytesWritten=len(encoded))
         if expire_seconds:
             redis_conn.expire(cache_key, time=expire_seconds)
+        _publish_invalidation(f'key:{cache_key}')
+        _local_cache_invalidate(f'key:{cache_key}')
+        _local_cache_set(cache_key, dict_object, local_expire_seconds or expire_seconds, local_cache_generation)
     else:
         raise InternalServerError(f'Invalid object type: {type(dict_object)}')
 
 
+@skip_when_pytest()
+def clear_flag(flag_key, flag_token):
+    _delete_if_token(flag_key, flag_token)
+
+
 @skip_when_pytest()
 def fetch_cached_dict_object(cache_key):
-    get_redis_conn(app)
-    cached_dict_object = redis_conn.get(cache_key)
-    return None if cached_dict_object is None else json.loads(cached_dict_object)
+    return _fetch_cached_dict_object(cache_key)[0]
+
+
+def fetch_or_fill_cached_dict_object(cache_key, fill_function, expire_seconds, stale_seconds=0, background_refresh=False):
+    """Return the cached object, calling fill_function to compute and cache it on a miss.
+
+    Only one caller at a time, across all processes, runs fill_function for a given key. For stale_seconds past
+    expire_seconds the old object is kept and served to other callers while it is recomputed; with background_refresh,
+    the caller who recomputes it also gets the stale object and the fill runs on a background thread. Callers arriving
+    during a fill with nothing to serve wait up to REDIS_CACHE_FILL_WAIT_SECONDS before computing it themselves.
+    """
+    cached_dict_object, is_fresh = _fetch_cached_dict_object(cache_key, stale_seconds) or (None, False)
+    if is_fresh:
+        return cached_dict_object
+    lock_token = _acquire_fill_lock(cache_key)
+    if lock_token:
+        if cached_dict_object and background_refresh:
+            _fill_in_background(cache_key, fill_function, expire_seconds, stale_seconds, lock_token)
+            return cached_dict_object
+        return _fill(cache_key, fill_function, expire_seconds, stale_seconds, lock_token)
+    if cached_dict_object:
+        return cached_dict_object
+    deadline = time.monotonic() + app.config['REDIS_CACHE_FILL_WAIT_SECONDS']
+    while time.monotonic() < deadline:
+        time.sleep(FILL_WAIT_POLL_SECONDS)
+        cached_dict_object = fetch_cached_dict_object(cache_key)
+        if cached_dict_object:
+            return cached_dict_object
+    app.logger.warning(f'Timed out waiting for another process to fill cache key {cache_key}')
+    return fill_function()
 
 
 @skip_when_pytest()
 def delete_cache_key(cache_key):
     get_redis_conn(app)
     redis_conn.delete(cache_key)
+    _publish_invalidation(f'key:{cache_key}')
+    _local_cache_invalidate(f'key:{cache_key}')
+
+
+@skip_when_pytest()
+def delete_cache_namespace(name):
+    pattern = CACHE_NAMESPACES[name]
+    deleted_count = _unlink_matching(pattern)
+    _publish_invalidation(f'pattern:{pattern}')
+    _local_cache_invalidate(f'pattern:{pattern}')
+    return deleted_count
 
 
 @skip_when_pytest()
 def delete_cache_prefix(prefix):
+    deleted_count = _unlink_matching(f'{prefix}:*')
+    _publish_invalidation(f'prefix:{prefix}:')
+    _local_cache_invalidate(f'prefix:{prefix}:')
+    return deleted_count
+
+
+@skip_when_pytest()
+def delete_indexed_cache_keys(index_key):
+    # Deletes the keys recorded under index_key by index_cache_key, without a keyspace scan. The index is read and dropped
+    # in one transaction, so keys indexed after the read land in a new index rather than being forgotten.
     get_redis_conn(app)
-    for key in redis_conn.scan_iter(f'{prefix}:*'):
-        redis_conn.delete(key)
+    pipeline = redis_conn.pipeline()
+    pipeline.smembers(index_key)
+    pipeline.delete(index_key)
+    cache_keys = sorted(k.decode('utf-8') for k in pipeline.execute()[0])
+    deleted_count = redis_conn.unlink(*cache_keys) if cache_keys else 0
+    for cache_key in cache_keys:
+        _publish_invalidation(f'key:{cache_key}')
+        _local_cache_invalidate(f'key:{cache_key}')
+    return deleted_count
 
 
 def enqueue(func, args):
@@ -89,6 +230,60 @@ def enqueue(func, args):
 def flushdb():
     get_redis_conn(app)
     redis_conn.flushdb()
+    _publish_invalidation('flush')
+    _local_cache_invalidate('flush')
+
+
+@skip_when_pytest(mock_object=[])
+def get_cache_namespace_stats():
+    get_redis_conn(app)
+    stats = []
+    for name, pattern in sorted(CACHE_NAMESPACES.items()):
+        key_count = 0
+        memory_bytes = 0
+        for keys in _scan_batches(pattern):
+            key_count += len(keys)
+            pipeline = redis_conn.pipeline(transaction=False)
+            for key in keys:
+                pipeline.memory_usage(key)
+            memory_bytes += sum(m for m in pipeline.execute(raise_on_error=False) if isinstance(m, int))
+        stats.append({
+            'keyCount': key_count,
+            'memoryBytes': memory_bytes,
+            'name': name,
+            'pattern': pattern,
+        })
+    return stats
+
+
+@skip_when_pytest(mock_object={})
+def get_cache_stats():
+    get_redis_conn(app)
+    _flush_cache_stats()
+    pipeline = redis_conn.pipeline(transaction=False)
+    namespaces = sorted(CACHE_NAMESPACES) + ['other']
+    for namespace in namespaces:
+        pipeline.hgetall(f'cache_stats:{namespace}')
+    stats = {}
+    for namespace, counters in zip(namespaces, pipeline.execute()):
+        if counters:
+            counters = {k.decode('utf-8'): float(v) for k, v in counters.items()}
+            lookups = counters.get('hits', 0) + counters.get('misses', 0)
+            fills = counters.get('fills', 0)
+            stats[namespace] = {
+                **counters,
+                'averageFillSeconds': counters.get('fillSeconds', 0) / fills if fills else None,
+                'hitRate': counters.get('hits', 0) / lookups if lookups else None,
+            }
+    return stats
+
+
+@skip_when_pytest()
+def get_flag(flag_key):
+    # Returns the token of a raised flag, or None.
+    get_redis_conn(app)
+    flag_token = redis_conn.get(flag_key)
+    return flag_token.decode('utf-8') if flag_token else None
 
 
 def get_job(job_id):
@@ -112,6 +307,16 @@ def get_url(app):
     return f"rediss://default:{app.config['REDIS_PASSWORD']}@{app.config['REDIS_HOST']}:{app.config['REDIS_PORT']}"
 
 
+@skip_when_pytest()
+def index_cache_key(index_key, cache_key, expire_seconds):
+    # Records cache_key in the Redis set index_key, for delete_indexed_cache_keys. The index should outlive its keys.
+    get_redis_conn(app)
+    pipeline = redis_conn.pipeline(transaction=False)
+    pipeline.sadd(index_key, cache_key)
+    pipeline.expire(index_key, expire_seconds)
+    pipeline.execute()
+
+
 def redis_ping():
     get_redis_conn(app)
     redis_ping = redis_conn.ping()
@@ -138,6 +343,22 @@ def redis_status():
     }
 
 
+@skip_when_pytest()
+def release_lock(lock_key, lock_token):
+    # Leave the lock alone if it expired and another caller now holds it.
+    _delete_if_token(lock_key, lock_token)
+
+
+@skip_when_pytest()
+def set_flag(flag_key, expire_seconds):
+    # Raises the flag and returns its token. Raising it again replaces the token, so that clear_flag with an earlier token
+    # leaves the flag up.
+    get_redis_conn(app)
+    flag_token = uuid4().hex
+    redis_conn.set(flag_key, flag_token, ex=expire_seconds)
+    return flag_token
+
+
 def _worker_to_api_json(worker):
     return {
         'currentJobWorkingTime': worker.current_job_working_time,
@@ -150,3 +371,237 @@ def _worker_to_api_json(worker):
         'successfulJobCount': worker.successful_job_count,
         'totalWorkingTime': worker.total_working_time,
     }
+
+
+def _acquire_fill_lock(cache_key):
+    return acquire_lock(f'fill_lock:{cache_key}', app.config['REDIS_CACHE_FILL_LOCK_SECONDS'])
+
+
+def _release_fill_lock(cache_key, lock_token):
+    release_lock(f'fill_lock:{cache_key}', lock_token)
+
+
+def _delete_if_token(key, token):
+    get_redis_conn(app)
+    with redis_conn.pipeline() as pipeline:
+        try:
+            pipeline.watch(key)
+            if pipeline.get(key) == token.encode('utf-8'):
+                pipeline.multi()
+                pipeline.delete(key)
+                pipeline.execute()
+        except redis.WatchError:
+            pass
+
+
+def _scan_batches(pattern):
+    scan = redis_conn.scan_iter(match=pattern, count=SCAN_BATCH_SIZE)
+    while True:
+        keys = list(islice(scan, SCAN_BATCH_SIZE))
+        if not keys:
+            return
+        yield keys
+
+
+def _unlink_matching(pattern):
+    # UNLINK frees memory off the main Redis thread. Each batch of matching keys is unlinked as the scan proceeds.
+    get_redis_conn(app)
+    deleted_count = 0
+    for keys in _scan_batches(pattern):
+        deleted_count += redis_conn.unlink(*keys)
+    return deleted_count
+
+
+def _fill(cache_key, fill_function, expire_seconds, stale_seconds, lock_token):
+    try:
+        fill_started_at = time.monotonic()
+        dict_object = fill_function()
+        _record_cache_stats(cache_key, fills=1, fillSeconds=time.monotonic() - fill_started_at)
+        if dict_object:
+            # Redis keeps the object through the stale window; the in-process copy only while it is fresh.
+            cache_dict_object(cache_key, dict_object, expire_seconds + stale_seconds, local_expire_seconds=expire_seconds)
+        return dict_object
+    finally:
+        _release_fill_lock(cache_key, lock_token)
+
+
+def _fill_in_background(cache_key, fill_function, expire_seconds, stale_seconds, lock_token):
+    global cache_refresh_executor
+    flask_app = app._get_current_object()
+
+    def _refresh():
+        with flask_app.app_context():
+            try:
+                _fill(cache_key, fill_function, expire_seconds, stale_seconds, lock_token)
+            except Exception as e:
+                app.logger.error(f'Background refresh of cache key {cache_key} failed')
+                app.logger.exception(e)
+
+    with cache_refresh_executor_lock:
+        if cache_refresh_executor is None:
+            cache_refresh_executor = ThreadPoolExecutor(max_workers=CACHE_REFRESH_MAX_WORKERS, thread_name_prefix='cache-refresh')
+        cache_refresh_executor.submit(_refresh)
+
+
+def _cache_namespace(cache_key):
+    return next((name for name, pattern in CACHE_NAMESPACES.items() if fnmatchcase(cache_key, pattern)), 'other')
+
+
+def _flush_cache_stats():
+    global cache_stats, cache_stats_flushed_at
+    with cache_stats_lock:
+        pending_stats = cache_stats
+        cache_stats = {}
+        cache_stats_flushed_at = time.monotonic()
+    if not pending_stats:
+        return
+    try:
+        pipeline = redis_conn.pipeline(transaction=False)
+        for namespace, counters in pending_stats.items():
+            for counter, value in counters.items():
+                pipeline.hincrbyfloat(f'cache_stats:{namespace}', counter, value)
+        pipeline.execute()
+    except Exception as e:
+        app.logger.error(f'Failed to flush cache stats: {e}')
+
+
+def _record_cache_stats(cache_key, **increments):
+    namespace = _cache_namespace(cache_key)
+    with cache_stats_lock:
+        counters = cache_stats.setdefault(namespace, {})
+        for counter, value in increments.items():
+            counters[counter] = counters.get(counter, 0) + value
+        flush_due = time.monotonic() - cache_stats_flushed_at > CACHE_STATS_FLUSH_SECONDS
+    if flush_due:
+        _flush_cache_stats()
+
+
+def _decode(cached_value):
+    codec = CODECS.get(cached_value[0:1])
+    if codec:
+        return json.loads(codec[1](cached_value[1:]))
+    return json.loads(cached_value)
+
+
+def _encode(dict_object):
+    encoded = json.dumps(dict_object, separators=(',', ':')).encode('utf-8')
+    version = CODEC_ZLIB_JSON if len(encoded) >= app.config['REDIS_CACHE_COMPRESSION_MIN_BYTES'] else CODEC_JSON
+    return version + CODECS[version][0](encoded)
+
+
+@skip_when_pytest()
+def _fetch_cached_dict_object(cache_key, stale_seconds=0):
+    # Returns (object, is_fresh). Objects cached with a stale window are fresh until their remaining TTL drops into it.
+    _local_cache_enabled()
+    cached_dict_object = _local_cache_get(cache_key)
+    if cached_dict_object is not None:
+        _record_cache_stats(cache_key, hits=1, localHits=1)
+        return cached_dict_object, True
+    generation = local_cache_generation
+    get_redis_conn(app)
+    pipeline = redis_conn.pipeline(transaction=False)
+    pipeline.get(cache_key)
+    pipeline.ttl(cache_key)
+    cached_value, ttl = pipeline.execute()
+    if cached_value is None:
+        _record_cache_stats(cache_key, misses=1)
+        return None, False
+    _record_cache_stats(cache_key, hits=1, bytesRead=len(cached_value))
+    cached_dict_object = _decode(cached_value)
+    fresh_seconds = ttl - stale_seconds if ttl > 0 else None
+    if fresh_seconds is None or fresh_seconds > 0:
+        _local_cache_set(cache_key, cached_dict_object, fresh_seconds, generation)
+        return cached_dict_object, True
+    return cached_dict_object, False
+
+
+def _ensure_invalidation_listener():
+    global invalidation_listener
+    with local_cache_lock:
+        if invalidation_listener and invalidation_listener.is_alive():
+            return True
+        # Any invalidations sent while we were not listening have been missed.
+        _local_cache_invalidate('flush')
+        try:
+            get_redis_conn(app)
+            pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: _on_invalidation_message})
+            invalidation_listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+            return True
+        except Exception as e:
+            app.logger.error(f'Failed to subscribe to cache invalidations; local cache disabled: {e}')
+            invalidation_listener = None
+            return False
+
+
+def _local_cache_get(cache_key):
+    if not (invalidation_listener and invalidation_listener.is_alive()):
+        return None
+    with local_cache_lock:
+        entry = local_cache.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, dict_object = entry
+        if expires_at < time.monotonic():
+            del local_cache[cache_key]
+            return None
+        local_cache.move_to_end(cache_key)
+    return deepcopy(dict_object)
+
+
+def _local_cache_invalidate(message):
+    global local_cache_generation
+    with local_cache_lock:
+        local_cache_generation += 1
+        if message == 'flush':
+            local_cache.clear()
+        elif message.startswith('key:'):
+            local_cache.pop(message[4:], None)
+        elif message.startswith('prefix:'):
+            prefix = message[7:]
+            for cache_key in [k for k in local_cache if k.startswith(prefix)]:
+                del local_cache[cache_key]
+        elif message.startswith('pattern:'):
+            pattern = message[8:]
+            for cache_key in [k for k in local_cache if fnmatchcase(k, pattern)]:
+                del local_cache[cache_key]
+
+
+def _local_cache_enabled():
+    # Called before a generation is read for _local_cache_set: starting the listener bumps the generation, which would
+    # otherwise discard the first object set.
+    return bool(app.config['REDIS_LOCAL_CACHE_MAX_KEYS']) and _ensure_invalidation_listener()
+
+
+def _local_cache_set(cache_key, dict_object, expire_seconds, generation):
+    max_keys = app.config['REDIS_LOCAL_CACHE_MAX_KEYS']
+    if not max_keys or not (invalidation_listener and invalidation_listener.is_alive()):
+        return
+    max_seconds = app.config['REDIS_LOCAL_CACHE_MAX_SECONDS']
+    dict_object = deepcopy(dict_object)
+    evicted_keys = []
+    with local_cache_lock:
+        if generation != local_cache_generation:
+            return
+        local_cache[cache_key] = (time.monotonic() + min(expire_seconds or max_seconds, max_seconds), dict_object)
+        local_cache.move_to_end(cache_key)
+        while len(local_cache) > max_keys:
+            evicted_key, _ = local_cache.popitem(last=False)
+            evicted_keys.append(evicted_key)
+    # Recording stats may flush them to Redis, which must not hold up other callers waiting on the local cache.
+    for evicted_key in evicted_keys:
+        _record_cache_stats(evicted_key, evictions=1)
+
+
+def _on_invalidation_message(message):
+    data = message.get('data')
+    node_id, _, invalidation = (data.decode('utf-8') if isinstance(data, bytes) else str(data)).partition(' ')
+    if node_id != local_cache_node_id:
+        _local_cache_invalidate(invalidation)
+
+
+def _publish_invalidation(message):
+    try:
+        redis_conn.publish(INVALIDATION_CHANNEL, f'{local_cache_node_id} {message}')
+    except Exception as e:
+        app.logger.error(f'Failed to publish cache invalidation ({message}): {e}')
@@ -23,18 +23,61 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
-from datetime import timedelta
+import csv
+from datetime import datetime, timedelta
+import io
+from operator import itemgetter
+import re
+from threading import RLock
 
 import boto3
 from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError
 from flask import current_app as app
+import pytz
+from ripley.externals.redis import acquire_lock, clear_flag, get_flag, release_lock, set_flag
 from ripley.lib.util import utc_now
 import smart_open
 import zipstream
 
+# Assumed-role credentials are good for STS_DURATION_SECONDS. The session and clients built on them are shared
+# process-wide and rebuilt STS_REFRESH_MARGIN_SECONDS before expiry. A presigned URL stops working when the credentials
+# that signed it expire, so signing asks for credentials that outlive the URL (assuming the role for longer if need be).
+STS_DURATION_SECONDS = 900
+STS_REFRESH_MARGIN_SECONDS = 60
 
-def find_all_dated_csvs(folder, csv_name):
-    return [key for key in iterate_monthly_folder(folder) if csv_name in key]
+aws_session_cache = {
+    'clients': {},
+    'expires_at': None,
+    'session': None,
+}
+aws_session_lock = RLock()
+
+DATED_CSV_TIMESTAMP_FORMAT = '%Y-%m-%d_%H-%M-%S'
+DATED_CSV_TIMESTAMP_REGEX = re.compile('\\d{4}-\\d{2}-\\d{2}_\\d{2}-\\d{2}-\\d{2}')
+
+# Each dated-CSV folder keeps one manifest per month, listing what upload_dated_csv has written there, so that lookups
+# cost a single GET rather than a LIST of the month's folder. A missing manifest is rebuilt from a listing. A manifest
+# that a writer failed to update is flagged stale in Redis; lookups list the folder instead until the next writer rebuilds
+# it. The flag outlives the month during which the manifest is read.
+DATED_CSV_MANIFEST_FIELDNAMES = ['timestamp', 'type', 'term', 'key']
+DATED_CSV_MANIFEST_LOCK_SECONDS = 60
+DATED_CSV_MANIFEST_LOCK_WAIT_SECONDS = 30
+DATED_CSV_MANIFEST_STALE_SECONDS = 32 * 24 * 60 * 60
+DATED_CSV_TERM_REGEX = re.compile('TERM-\\d{4}-\\w')
+
+
+def find_all_dated_csvs(folder, csv_name, since=None):
+    return [e['key'] for e in iterate_dated_csv_manifest(folder) if csv_name in e['key'] and (not since or e['timestamp'] >= since)]
+
+
+def download_object(key, local_name):
+    bucket = app.config['AWS_S3_BUCKET']
+    try:
+        _get_s3_client().download_file(bucket, key, local_name)
+        return True
+    except (ClientError, BotoConnectionError, ValueError) as e:
+        app.logger.error(f'Error downloading S3 object: bucket={bucket}, key={key}, error={e}')
+        return False
 
 
 def find_last_dated_csv(folder, csv_name):
@@ -45,13 +88,26 @@ def find_last_dated_csv(folder, csv_name):
 
 def find_last_dated_csvs(folder, csv_names):
     csvs_by_name = {}
-    for object_key in iterate_monthly_folder(folder):
+    for entry in iterate_dated_csv_manifest(folder):
         for csv_name in csv_names:
-            if csv_name in object_key:
-                csvs_by_name[csv_name] = object_key
+            if csv_name in entry['key']:
+                csvs_by_name[csv_name] = entry['key']
     return csvs_by_name
 
 
+def find_recent_dated_csv(folder, csv_name, max_age_seconds):
+    newest_key = find_last_dated_csv(folder, csv_name)
+    newest_timestamp = newest_key and get_dated_csv_timestamp(newest_key)
+    if newest_timestamp and (utc_now() - newest_timestamp).total_seconds() <= max_age_seconds:
+        return newest_key
+
+
+def get_dated_csv_timestamp(object_key):
+    match = DATED_CSV_TIMESTAMP_REGEX.search(object_key)
+    if match:
+        return datetime.strptime(match.group(0), DATED_CSV_TIMESTAMP_FORMAT).replace(tzinfo=pytz.utc)
+
+
 def get_keys_with_prefix(prefix, bucket=None):
     if not bucket:
         bucket = app.config['AWS_S3_BUCKET']
@@ -85,35 +141,20 @@ def get_object_text(key):
 
 
 def get_signed_urls(bucket, keys, expiration):
-    client = _get_s3_client()
+    client = _get_s3_client(min_lifetime_seconds=expiration)
     return {key: _generate_signed_url(client, bucket, key, expiration) for key in keys}
 
 
-def iterate_monthly_folder(folder):
-    bucket = app.config['AWS_S3_BUCKET']
-    session = _get_session()
-    s3 = session.client('s3')
-
-    def _iterate_folder(timestamp):
-        prefix = f"{folder}/{timestamp.strftime('%Y/%m')}"
-        try:
-            paginator = s3.get_paginator('list_objects')
-            page_iterator = paginator.paginate(Bucket=bucket, Prefix=prefix)
-            for page in page_iterator:
-                if 'Contents' in page:
-                    for o in page['Contents']:
-                        object_key = o.get('Key')
-                        yield object_key
-        except Exception as e:
-            app.logger.error(f'Search of S3 folder failed (s3://{bucket}/{prefix})')
-            app.logger.exception(e)
-
-    # The first of the month is a special case under which we'll want to check last month's folder as well.
-    if utc_now().day == 1:
-        for key in _iterate_folder(utc_now() - timedelta(days=1)):
-            yield key
-    for key in _iterate_folder(utc_now()):
-        yield key
+def iterate_dated_csv_manifest(folder):
+    # Manifest entries are yielded in timestamp order. The first of the month also covers last month.
+    months = [utc_now() - timedelta(days=1), utc_now()] if utc_now().day == 1 else [utc_now()]
+    for month in months:
+        month_key = month.strftime('%Y-%m')
+        entries = None if _is_dated_csv_manifest_stale(folder, month_key) else _get_dated_csv_manifest(folder, month_key)
+        if entries is None:
+            entries = _list_dated_csv_manifest(folder, month.strftime('%Y/%m'))
+        for entry in sorted(entries, key=itemgetter('timestamp', 'key')):
+            yield entry
 
 
 def put_binary_data_to_s3(key, binary_data, content_type):
@@ -131,8 +172,7 @@ def put_binary_data_to_s3(key, binary_data, content_type):
 def stream_folder_zipped(folder_key):
     bucket = app.config['AWS_S3_BUCKET']
     z = zipstream.ZipFile(mode='w', compression=zipstream.ZIP_DEFLATED)
-    session = _get_session()
-    s3 = session.client('s3')
+    s3 = _get_s3_client()
 
     try:
         paginator = s3.get_paginator('list_objects')
@@ -142,7 +182,7 @@ def stream_folder_zipped(folder_key):
                 for o in page['Contents']:
                     object_key = o.get('Key')
                     s3_url = f's3://{bucket}/{object_key}'
-                    s3_stream = smart_open.open(s3_url, 'rb', transport_params={'client': session.client('s3')})
+                    s3_stream = smart_open.open(s3_url, 'rb', transport_params={'client': s3})
                     filename = object_key.replace(f'{folder_key}/', '')
                     z.write_iter(filename, s3_stream)
         return z
@@ -157,8 +197,7 @@ def stream_object_text(object_key, bucket=None):
         bucket = app.config['AWS_S3_BUCKET']
     s3_url = f's3://{bucket}/{object_key}'
     try:
-        session = _get_session()
-        return smart_open.open(s3_url, 'r', transport_params={'client': session.client('s3')})
+        return smart_open.open(s3_url, 'r', transport_params={'client': _get_s3_client()})
     except Exception as e:
         app.logger.error(f'S3 stream operation failed (s3_url={s3_url})')
         app.logger.exception(e)
@@ -166,34 +205,144 @@ def stream_object_text(object_key, bucket=None):
 
 
 def upload_dated_csv(folder, local_name, remote_name, timestamp):
+    object_key = f'{folder}/{timestamp[0:4]}/{timestamp[5:7]}/{timestamp[8:10]}/{remote_name}-{timestamp}.csv'
     with open(local_name, mode='rb') as f:
-        return put_binary_data_to_s3(
-            f'{folder}/{timestamp[0:4]}/{timestamp[5:7]}/{timestamp[8:10]}/{remote_name}-{timestamp}.csv',
-            f,
-            'text/csv',
-        )
+        result = put_binary_data_to_s3(object_key, f, 'text/csv')
+    if result:
+        _append_to_dated_csv_manifest(folder, _dated_csv_manifest_entry(object_key, remote_name, timestamp))
+    return result
+
+
+def _append_to_dated_csv_manifest(folder, entry):
+    month = entry['timestamp'][0:7]
+    manifest_key = _dated_csv_manifest_key(folder, month)
+    # S3 has no append, so the manifest is read and rewritten. A Redis lock keeps writers, in this process or any other,
+    # from interleaving and dropping one another's entries. A writer that cannot update the manifest flags it stale rather
+    # than touching it without the lock.
+    lock_key = f'dated_csv_manifest_lock:{manifest_key}'
+    lock_token = acquire_lock(lock_key, DATED_CSV_MANIFEST_LOCK_SECONDS, wait_seconds=DATED_CSV_MANIFEST_LOCK_WAIT_SECONDS)
+    if not lock_token:
+        app.logger.error(f"Timed out waiting to record {entry['key']} in dated CSV manifest; it will be rebuilt from S3 listing.")
+        set_flag(_dated_csv_manifest_stale_key(manifest_key), DATED_CSV_MANIFEST_STALE_SECONDS)
+        return False
+    try:
+        stale_token = get_flag(_dated_csv_manifest_stale_key(manifest_key))
+        entries = None if stale_token else _get_dated_csv_manifest(folder, month)
+        if entries is None:
+            entries = _list_dated_csv_manifest(folder, month.replace('-', '/'))
+        if not next((e for e in entries if e['key'] == entry['key']), None):
+            entries.append(entry)
+        f = io.StringIO()
+        writer = csv.DictWriter(f, fieldnames=DATED_CSV_MANIFEST_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(entries)
+        if put_binary_data_to_s3(manifest_key, f.getvalue().encode('utf-8'), 'text/csv'):
+            if stale_token:
+                # A writer that times out after our listing raises the flag anew, and it stays up.
+                clear_flag(_dated_csv_manifest_stale_key(manifest_key), stale_token)
+            return True
+        app.logger.error(f"Failed to record {entry['key']} in dated CSV manifest; it will be rebuilt from S3 listing.")
+        set_flag(_dated_csv_manifest_stale_key(manifest_key), DATED_CSV_MANIFEST_STALE_SECONDS)
+        return False
+    finally:
+        release_lock(lock_key, lock_token)
+
+
+def _dated_csv_manifest_entry(object_key, remote_name=None, timestamp=None):
+    if not timestamp:
+        timestamp_match = DATED_CSV_TIMESTAMP_REGEX.search(object_key)
+        if not timestamp_match:
+            return None
+        timestamp = timestamp_match.group(0)
+    if not remote_name:
+        remote_name = object_key.rsplit('/', 1)[-1].replace(f'-{timestamp}.csv', '')
+    term_match = DATED_CSV_TERM_REGEX.search(remote_name)
+    return {
+        'timestamp': timestamp,
+        'type': remote_name[0:term_match.start()].rstrip('-') if term_match else remote_name,
+        'term': term_match.group(0).replace('TERM-', 'TERM:') if term_match else '',
+        'key': object_key,
+    }
 
 
-def _get_s3_client():
-    return _get_session().client('s3', region_name=app.config['AWS_S3_REGION'])
+def _dated_csv_manifest_key(folder, month):
+    return f'{folder}/manifests/{month}.csv'
 
 
-def _get_session():
-    credentials = _get_sts_credentials()
-    return boto3.Session(
-        aws_access_key_id=credentials['AccessKeyId'],
-        aws_secret_access_key=credentials['SecretAccessKey'],
-        aws_session_token=credentials['SessionToken'],
-    )
+def _dated_csv_manifest_stale_key(manifest_key):
+    return f'dated_csv_manifest_stale:{manifest_key}'
+
+
+def _get_dated_csv_manifest(folder, month):
+    bucket = app.config['AWS_S3_BUCKET']
+    key = _dated_csv_manifest_key(folder, month)
+    try:
+        body = _get_s3_client().get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8')
+        return list(csv.DictReader(io.StringIO(body)))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'NoSuchKey':
+            app.logger.error(f'Error retrieving dated CSV manifest: bucket={bucket}, key={key}, error={e}')
+        return None
+    except (BotoConnectionError, ValueError) as e:
+        app.logger.error(f'Error retrieving dated CSV manifest: bucket={bucket}, key={key}, error={e}')
+        return None
+
+
+def _is_dated_csv_manifest_stale(folder, month):
+    try:
+        return bool(get_flag(_dated_csv_manifest_stale_key(_dated_csv_manifest_key(folder, month))))
+    except Exception as e:
+        app.logger.error(f'Failed to check dated CSV manifest for staleness; listing the folder instead: {e}')
+        return True
+
+
+def _list_dated_csv_manifest(folder, month_path):
+    object_keys = get_keys_with_prefix(f'{folder}/{month_path}') or []
+    return [e for e in (_dated_csv_manifest_entry(key) for key in object_keys) if e]
+
+
+def _get_s3_client(min_lifetime_seconds=0):
+    region = app.config['AWS_S3_REGION']
+    # Boto3 clients are thread-safe once created, but sessions are not; build clients under the lock.
+    with aws_session_lock:
+        session = _get_session(min_lifetime_seconds)
+        client = aws_session_cache['clients'].get(region)
+        if not client:
+            client = session.client('s3', region_name=region)
+            aws_session_cache['clients'][region] = client
+        return client
+
+
+def _get_session(min_lifetime_seconds=0):
+    required_seconds = min_lifetime_seconds + STS_REFRESH_MARGIN_SECONDS
+    with aws_session_lock:
+        expires_at = aws_session_cache['expires_at']
+        if not aws_session_cache['session'] or not expires_at or utc_now() >= expires_at - timedelta(seconds=required_seconds):
+            credentials = _get_sts_credentials(STS_DURATION_SECONDS + min_lifetime_seconds)
+            aws_session_cache['session'] = boto3.Session(
+                aws_access_key_id=credentials['AccessKeyId'],
+                aws_secret_access_key=credentials['SecretAccessKey'],
+                aws_session_token=credentials['SessionToken'],
+            )
+            aws_session_cache['clients'] = {}
+            aws_session_cache['expires_at'] = _credentials_expiration(credentials)
+        return aws_session_cache['session']
+
+
+def _credentials_expiration(credentials):
+    expiration = credentials.get('Expiration')
+    if not expiration:
+        return utc_now() + timedelta(seconds=STS_DURATION_SECONDS)
+    return expiration if expiration.tzinfo else expiration.replace(tzinfo=pytz.utc)
 
 
-def _get_sts_credentials():
+def _get_sts_credentials(duration_seconds=STS_DURATION_SECONDS):
     sts_client = boto3.client('sts')
     role_arn = app.config['AWS_APP_ROLE_ARN']
     assumed_role_object = sts_client.assume_role(
         RoleArn=role_arn,
         RoleSessionName='AssumeAppRoleSession',
-        DurationSeconds=900,
+        DurationSeconds=duration_seconds,
     )
     return assumed_role_object['Credentials']
 
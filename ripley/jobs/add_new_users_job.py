@@ -33,6 +33,7 @@ from ripley.externals.data_loch import get_all_active_users
 from ripley.externals.s3 import upload_dated_csv
 from ripley.jobs.base_job import BaseJob
 from ripley.jobs.errors import BackgroundJobError
+from ripley.lib.canvas_report_utils import get_provisioning_reports
 from ripley.lib.canvas_site_utils import uid_from_canvas_login_id
 from ripley.lib.canvas_user_utils import csv_row_for_campus_user
 
@@ -46,41 +47,39 @@ class AddNewUsersJob(BaseJob):
 
         dry_run = params.get('isDryRun', None) or False
 
-        canvas.get_csv_report('users', download_path=canvas_export_file.name)
-
-        # Start with a map of all users.
-        new_users_by_uid = {r['ldap_uid']: r for r in get_all_active_users()}
+        report_specs = {'users': {'report_type': 'users', 'download_path': canvas_export_file.name}}
+        if not all(success for key, success in get_provisioning_reports(report_specs, timestamp, 'add-new')):
+            raise BackgroundJobError('Canvas users report unavailable.')
 
+        # Collect UIDs that already exist in Canvas.
+        canvas_uids = set()
         with open(canvas_export_file.name, 'r') as f:
-            canvas_export = csv.DictReader(f)
-            # Remove users from map where UID already exists in Canvas.
-            for row in canvas_export:
-                uid = uid_from_canvas_login_id(row['login_id'])['uid']
-                new_users_by_uid.pop(uid, None)
+            for row in csv.DictReader(f):
+                canvas_uids.add(uid_from_canvas_login_id(row['login_id'])['uid'])
+
+        # Stream active campus users, writing out those not yet in Canvas.
+        new_uids = set()
+        with open(canvas_import_file.name, 'w') as f:
+            canvas_import = csv.DictWriter(f, fieldnames=['user_id', 'login_id', 'first_name', 'last_name', 'email', 'status']) # noqa
+            canvas_import.writeheader()
+            for user in get_all_active_users():
+                uid = user['ldap_uid']
+                if uid not in canvas_uids and uid not in new_uids:
+                    new_uids.add(uid)
+                    canvas_import.writerow(csv_row_for_campus_user(user))
 
-        if not len(new_users_by_uid):
+        if not len(new_uids):
             app.logger.info('No new users to add, job complete.')
             return
         else:
-            app.logger.info(f'Will add {len(new_users_by_uid)} new users.')
-            with open(canvas_import_file.name, 'w') as f:
-                canvas_import = csv.DictWriter(f, fieldnames=['user_id', 'login_id', 'first_name', 'last_name', 'email', 'status']) # noqa
-                canvas_import.writeheader()
-                for user in new_users_by_uid.values():
-                    canvas_import.writerow(csv_row_for_campus_user(user))
+            app.logger.info(f'Will add {len(new_uids)} new users.')
             if dry_run:
                 app.logger.info('Dry run mode, will not post SIS import file to Canvas.')
             else:
                 if not canvas.post_sis_import(canvas_import_file.name):
                     raise BackgroundJobError('New users import failed.')
 
-            # Archive export and import files in S3.
-            upload_dated_csv(
-                folder='canvas-provisioning-reports',
-                local_name=canvas_export_file.name,
-                remote_name='provisioned-users-add-new',
-                timestamp=timestamp,
-            )
+            # Archive import file in S3. The export file was archived when downloaded.
             upload_dated_csv(
                 folder='canvas-sis-imports',
                 local_name=canvas_import_file.name,
@@ -41,6 +41,7 @@ from ripley.externals.s3 import find_all_dated_csvs, find_last_dated_csv, find_l
 from ripley.jobs.base_job import BaseJob
 from ripley.lib.berkeley_term import BerkeleyTerm
 from ripley.lib.calnet_utils import get_basic_attributes
+from ripley.lib.canvas_report_utils import get_provisioning_reports
 from ripley.lib.canvas_site_provisioning import initialize_recent_updates, process_course_enrollments
 from ripley.lib.canvas_site_utils import api_formatted_course_role, format_term_enrollments_export, \
     parse_canvas_sis_section_id, uid_from_canvas_login_id
@@ -87,6 +88,8 @@ class BcoursesRefreshBaseJob(BaseJob):
         if self.job_flags.enrollments:
             self.initialize_enrollment_provisioning_reports(sis_term_ids, users_by_uid)
 
+        self.download_canvas_reports(sis_term_ids, timestamp)
+
         with sis_import_csv_set(sis_term_ids) as csv_set:
             self.known_users = {}
             self.known_sis_id_updates = {}
@@ -126,6 +129,41 @@ class BcoursesRefreshBaseJob(BaseJob):
             CanvasSynchronization.update(enrollments=this_sync, instructors=this_sync)
         app.logger.info(f'bCourses refresh job (mode={self.__class__.__name__}) complete.')
 
+    def download_canvas_reports(self, sis_term_ids, timestamp):
+        # Request every Canvas report this run needs up front, so that Canvas generates them in parallel. Recently
+        # archived reports are reused rather than regenerated.
+        report_specs = {}
+        if not self.job_flags.incremental:
+            report_specs['users'] = {'report_type': 'users'}
+        if self.job_flags.enrollments:
+            for sis_term_id in self.enrollment_terms_to_process(sis_term_ids):
+                report_specs[sis_term_id] = {'report_type': 'sections', 'term_id': sis_term_id}
+
+        self.canvas_reports = {}
+        for key, report_spec in report_specs.items():
+            report_file = tempfile.NamedTemporaryFile()
+            report_spec['download_path'] = report_file.name
+            self.canvas_reports[key] = report_file
+        for key, success in get_provisioning_reports(report_specs, timestamp, self._csv_key()):
+            if not success:
+                self.canvas_reports[key] = None
+
+    def enrollment_terms_to_process(self, sis_term_ids):
+        sis_term_ids_to_process = []
+        for sis_term_id in sis_term_ids:
+            if (
+                self.job_flags.incremental
+                and sis_term_id not in self.enrollment_updates and sis_term_id not in self.instructor_updates
+            ):
+                continue
+
+            term_id = BerkeleyTerm.from_canvas_sis_term_id(sis_term_id).to_sis_term_id()
+            if not get_sections_count(term_id):
+                app.logger.error(f'No section data found in loch for term {term_id}, will not process enrollments.')
+                continue
+            sis_term_ids_to_process.append(sis_term_id)
+        return sis_term_ids_to_process
+
     def initialize_enrollment_provisioning_reports(self, sis_term_ids, users_by_uid):
         self.enrollment_provisioning_reports = {}
         export_filenames = {term_id: format_term_enrollments_export(term_id) for term_id in sis_term_ids}
@@ -145,10 +183,7 @@ class BcoursesRefreshBaseJob(BaseJob):
         # recent exports so that we don't repeat changes picked up in a previous incremental job.
         users_by_user_id = {user_id_from_attributes(u): u for u in users_by_uid.values()}
         last_sync_timestamp = CanvasSynchronization.get_latest_term_enrollment_csv_set().strftime('%F_%H-%M-%S')
-        for enrollment_export_csv in find_all_dated_csvs('canvas-sis-imports', 'enrollments-TERM'):
-            timestamp_match = re.search('\\d{4}-\\d{2}-\\d{2}_\\d{2}-\\d{2}-\\d{2}', enrollment_export_csv)
-            if not timestamp_match or timestamp_match.group(0) < last_sync_timestamp:
-                continue
+        for enrollment_export_csv in find_all_dated_csvs('canvas-sis-imports', 'enrollments-TERM', since=last_sync_timestamp):
             term_id_match = re.search('TERM-\\d{4}-\\w', enrollment_export_csv)
             if not term_id_match:
                 continue
@@ -202,19 +237,15 @@ class BcoursesRefreshBaseJob(BaseJob):
             return
         last_user_report_timestamp = timestamp_match.group(0)
 
-        for user_import_csv in find_all_dated_csvs('canvas-sis-imports', 'user-provision'):
-            timestamp_match = re.search('\\d{4}-\\d{2}-\\d{2}_\\d{2}-\\d{2}-\\d{2}', user_import_csv)
-            if timestamp_match and timestamp_match.group(0) >= last_user_report_timestamp:
-                for row in csv.DictReader(stream_object_text(user_import_csv)):
-                    account_data = uid_from_canvas_login_id(row['login_id'])
-                    uid = account_data['uid']
-                    self.known_users[uid] = str(row['user_id'])
+        for user_import_csv in find_all_dated_csvs('canvas-sis-imports', 'user-provision', since=last_user_report_timestamp):
+            for row in csv.DictReader(stream_object_text(user_import_csv)):
+                account_data = uid_from_canvas_login_id(row['login_id'])
+                uid = account_data['uid']
+                self.known_users[uid] = str(row['user_id'])
 
-        for sis_id_import_csv in find_all_dated_csvs('canvas-sis-imports', 'sis-ids'):
-            timestamp_match = re.search('\\d{4}-\\d{2}-\\d{2}_\\d{2}-\\d{2}-\\d{2}', user_import_csv)
-            if timestamp_match and timestamp_match.group(0) >= last_user_report_timestamp:
-                for row in csv.DictReader(stream_object_text(sis_id_import_csv)):
-                    self.known_sis_id_updates[str(row['old_id'])] = str(row['new_id'])
+        for sis_id_import_csv in find_all_dated_csvs('canvas-sis-imports', 'sis-ids', since=last_user_report_timestamp):
+            for row in csv.DictReader(stream_object_text(sis_id_import_csv)):
+                self.known_sis_id_updates[str(row['old_id'])] = str(row['new_id'])
 
     @contextmanager
     def get_canvas_user_report(self, timestamp, users_by_uid):
@@ -223,14 +254,7 @@ class BcoursesRefreshBaseJob(BaseJob):
             self.patch_user_updates(previous_user_report)
             yield stream_object_text(previous_user_report)
         else:
-            canvas_users_file = tempfile.NamedTemporaryFile()
-            canvas.get_csv_report('users', download_path=canvas_users_file.name)
-            upload_dated_csv(
-                folder='canvas-provisioning-reports',
-                local_name=canvas_users_file.name,
-                remote_name=f'provisioned-users-{self._csv_key()}',
-                timestamp=timestamp,
-            )
+            canvas_users_file = self.canvas_reports.get('users') or tempfile.NamedTemporaryFile()
             # If the job flag is not incremental, then we haven't yet called directly to LDAP for any users missing from
             # the data loch snapshot, and need a preliminary loop through the users report to flag any UIDs that
             # might be missing.
@@ -317,21 +341,11 @@ class BcoursesRefreshBaseJob(BaseJob):
         return new_row
 
     def process_enrollments(self, csv_set):
+        # Full refreshes share one prefetch cache, filled per campus term as sections are processed.
+        term_prefetch = None if self.job_flags.incremental else {}
         for sis_term_id in csv_set.enrollment_terms.keys():
-            if (
-                self.job_flags.incremental
-                and sis_term_id not in self.enrollment_updates and sis_term_id not in self.instructor_updates
-            ):
-                continue
-
-            term_id = BerkeleyTerm.from_canvas_sis_term_id(sis_term_id).to_sis_term_id()
-            if not get_sections_count(term_id):
-                app.logger.error(f'No section data found in loch for term {term_id}, will not process enrollments.')
-                continue
-
-            canvas_sections_file = tempfile.NamedTemporaryFile()
-            sections_report = canvas.get_csv_report('sections', download_path=canvas_sections_file.name, term_id=sis_term_id)
-            if not sections_report:
+            canvas_sections_file = self.canvas_reports.get(sis_term_id)
+            if not canvas_sections_file:
                 continue
 
             if self.job_flags.incremental:
@@ -364,6 +378,7 @@ class BcoursesRefreshBaseJob(BaseJob):
                                 csv_set,
                                 self.known_users,
                                 self.job_flags.incremental,
+                                term_prefetch=term_prefetch,
                             )
 
     def upload_results(self, csv_set, timestamp):  # noqa C901
@@ -448,8 +463,9 @@ class BcoursesRefreshBaseJob(BaseJob):
             success_count = 0
             error_count = 0
 
-            for canvas_user_id in self.email_deletions:
-                for channel in canvas.get_communication_channels(canvas_user_id):
+            def _delete_email_channels(canvas_user_id):
+                results = []
+                for channel in canvas.get_communication_channels(canvas_user_id) or []:
                     if channel.type == 'email':
                         if self.dry_run:
                             app.logger.info(f'Dry run mode, would delete communication channel {channel}.')
@@ -459,17 +475,32 @@ class BcoursesRefreshBaseJob(BaseJob):
                                 app.logger.info(f'Deleting communication channel {channel}.')
                                 channel.delete()
                                 result = 'success'
-                                success_count += 1
                             except Exception as e:
                                 app.logger.error(f'Error deleting communication channel {channel}.')
                                 app.logger.exception(e)
                                 result = 'error'
-                                error_count += 1
-                        email_deletions.writerow({
-                            'canvas_user_id': canvas_user_id,
-                            'email_address': channel.address,
-                            'result': result,
-                        })
+                        results.append((channel.address, result))
+                return results
+
+            errors = []
+            for canvas_user_id, results in canvas.fetch_concurrently(_delete_email_channels, self.email_deletions, errors=errors):
+                for email_address, result in results:
+                    if result == 'success':
+                        success_count += 1
+                    elif result == 'error':
+                        error_count += 1
+                    email_deletions.writerow({
+                        'canvas_user_id': canvas_user_id,
+                        'email_address': email_address,
+                        'result': result,
+                    })
+            for canvas_user_id, e in errors:
+                error_count += 1
+                email_deletions.writerow({
+                    'canvas_user_id': canvas_user_id,
+                    'email_address': None,
+                    'result': 'error',
+                })
 
         if not self.dry_run:
             app.logger.info(f'Communication channel deletion results: {success_count} successes, {error_count} errors.')
@@ -24,6 +24,7 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 import csv
+import os
 import tempfile
 
 from flask import current_app as app
@@ -36,6 +37,27 @@ from ripley.lib.canvas_site_utils import format_term_enrollments_export
 from ripley.lib.util import utc_now
 from ripley.models.canvas_synchronization import CanvasSynchronization
 
+EXPORT_FIELDNAMES = [
+    'course_id',
+    'canvas_section_id',
+    'sis_section_id',
+    'canvas_user_id',
+    'sis_login_id',
+    'sis_user_id',
+    'role',
+    'sis_import_id',
+    'enrollment_state',
+]
+
+EXPORT_MODES = ['api', 'provisioning_report']
+
+# Provisioning reports name built-in roles by their short CSV form, while the enrollments API names them by enrollment type.
+BASE_ROLES = ['designer', 'observer', 'student', 'ta', 'teacher']
+
+# Provisioning reports flag SIS-created enrollments without giving an import id. Downstream consumers only need a
+# non-empty value.
+REPORT_SIS_IMPORT_ID = 'provisioning_report'
+
 
 class ExportTermEnrollmentsJob(BaseJob):
 
@@ -46,60 +68,132 @@ class ExportTermEnrollmentsJob(BaseJob):
         if not sis_term_ids:
             sis_term_ids = [t.to_canvas_sis_term_id() for t in BerkeleyTerm.get_current_terms().values()]
 
-        for sis_term_id in sis_term_ids:
-            export_file = tempfile.NamedTemporaryFile(suffix='.csv')
-
-            enrollment_count = 0
-
-            with open(export_file.name, 'w') as f:
-                canvas_export = csv.DictWriter(f, fieldnames=[
-                    'course_id',
-                    'canvas_section_id',
-                    'sis_section_id',
-                    'canvas_user_id',
-                    'sis_login_id',
-                    'sis_user_id',
-                    'role',
-                    'sis_import_id',
-                    'enrollment_state',
-                ])
-
-                canvas_export.writeheader()
-
-                sections_report = canvas.get_csv_report('sections', term_id=sis_term_id)
-                if not sections_report:
-                    continue
-                for section_row in sections_report:
-                    section_id = section_row['canvas_section_id']
-                    canvas_section_enrollments = canvas.get_section(section_id, api_call=False).get_enrollments()
-                    for enrollment in canvas_section_enrollments:
-                        canvas_export.writerow({
-                            'course_id': enrollment.course_id,
-                            'canvas_section_id': enrollment.course_section_id,
-                            'sis_section_id': enrollment.sis_section_id,
-                            'canvas_user_id': enrollment.user_id,
-                            'role': enrollment.role,
-                            'sis_import_id': enrollment.sis_import_id,
-                            'sis_user_id': enrollment.user['sis_user_id'],
-                            'sis_login_id': enrollment.user['login_id'],
-                            'enrollment_state': enrollment.enrollment_state,
-                        })
-                        enrollment_count += 1
-
-            if enrollment_count:
-                app.logger.info(f'Will upload {enrollment_count} enrollments for term {sis_term_id}.')
-
-                if not upload_dated_csv(
-                    folder='canvas-provisioning-reports',
-                    local_name=export_file.name,
-                    remote_name=format_term_enrollments_export(sis_term_id),
-                    timestamp=this_sync.strftime('%F_%H-%M-%S'),
-                ):
-                    raise BackgroundJobError('New users import failed.')
+        mode = params.get('mode', None) or app.config['EXPORT_TERM_ENROLLMENTS_MODE']
+        if mode not in EXPORT_MODES:
+            raise BackgroundJobError(f'Unknown term enrollments export mode: {mode}')
+
+        with tempfile.TemporaryDirectory() as report_dir:
+            report_paths = self._download_reports(mode, sis_term_ids, report_dir)
+            if mode == 'provisioning_report':
+                login_ids_by_canvas_user_id = self._get_login_ids(report_paths.get('users'))
+                if login_ids_by_canvas_user_id is None:
+                    raise BackgroundJobError('Canvas users report unavailable, enrollments not exported.')
+
+            for sis_term_id in sis_term_ids:
+                export_file = tempfile.NamedTemporaryFile(suffix='.csv')
+
+                with open(export_file.name, 'w') as f:
+                    canvas_export = csv.DictWriter(f, fieldnames=EXPORT_FIELDNAMES)
+                    canvas_export.writeheader()
+                    if mode == 'provisioning_report':
+                        enrollment_count = self._export_from_reports(canvas_export, sis_term_id, report_paths, login_ids_by_canvas_user_id)
+                    else:
+                        enrollment_count = self._export_from_api(canvas_export, sis_term_id, report_paths)
+
+                if enrollment_count:
+                    app.logger.info(f'Will upload {enrollment_count} enrollments for term {sis_term_id}.')
+
+                    if not upload_dated_csv(
+                        folder='canvas-provisioning-reports',
+                        local_name=export_file.name,
+                        remote_name=format_term_enrollments_export(sis_term_id),
+                        timestamp=this_sync.strftime('%F_%H-%M-%S'),
+                    ):
+                        raise BackgroundJobError('New users import failed.')
 
         CanvasSynchronization.update(term_enrollment_csvs=this_sync)
         app.logger.info('Enrollemnts exported, job complete.')
 
+    def _download_reports(self, mode, sis_term_ids, report_dir):
+        # Every report the job needs, for all terms, is requested up front so that Canvas generates them in parallel.
+        # Returns download paths by report key (e.g. 'sections:TERM:2023-B'), for the reports that arrived.
+        report_types = ['sections', 'enrollments'] if mode == 'provisioning_report' else ['sections']
+        report_specs = {}
+        for sis_term_id in sis_term_ids:
+            for report_type in report_types:
+                report_specs[f'{report_type}:{sis_term_id}'] = {
+                    'download_path': os.path.join(report_dir, f"{report_type}-{sis_term_id.replace(':', '-')}.csv"),
+                    'report_type': report_type,
+                    'term_id': sis_term_id,
+                }
+        if mode == 'provisioning_report':
+            report_specs['users'] = {
+                'download_path': os.path.join(report_dir, 'users.csv'),
+                'report_type': 'users',
+            }
+        return {key: download.path for key, download in canvas.get_csv_reports(report_specs) if download}
+
+    def _export_from_api(self, canvas_export, sis_term_id, report_paths):
+        enrollment_count = 0
+        sections_path = report_paths.get(f'sections:{sis_term_id}')
+        if not sections_path:
+            return enrollment_count
+
+        def _get_section_enrollments(section_row):
+            return list(canvas.get_section(section_row['canvas_section_id'], api_call=False).get_enrollments())
+
+        errors = []
+        with open(sections_path, 'r') as f:
+            sections_report = csv.DictReader(f)
+            for section_row, canvas_section_enrollments in canvas.fetch_concurrently(_get_section_enrollments, sections_report, errors=errors):
+                for enrollment in canvas_section_enrollments:
+                    canvas_export.writerow({
+                        'course_id': enrollment.course_id,
+                        'canvas_section_id': enrollment.course_section_id,
+                        'sis_section_id': enrollment.sis_section_id,
+                        'canvas_user_id': enrollment.user_id,
+                        'role': enrollment.role,
+                        'sis_import_id': enrollment.sis_import_id,
+                        'sis_user_id': enrollment.user['sis_user_id'],
+                        'sis_login_id': enrollment.user['login_id'],
+                        'enrollment_state': enrollment.enrollment_state,
+                    })
+                    enrollment_count += 1
+        if errors:
+            raise BackgroundJobError(f'Failed to retrieve enrollments for {len(errors)} sections in {sis_term_id}.')
+        return enrollment_count
+
+    def _export_from_reports(self, canvas_export, sis_term_id, report_paths, login_ids_by_canvas_user_id):
+        enrollment_count = 0
+        sections_path = report_paths.get(f'sections:{sis_term_id}')
+        enrollments_path = report_paths.get(f'enrollments:{sis_term_id}')
+        if not sections_path or not enrollments_path:
+            return enrollment_count
+
+        with open(sections_path, 'r') as f:
+            sis_section_ids = {r['canvas_section_id']: r['section_id'] for r in csv.DictReader(f)}
+
+        # Consumers of the export group rows by section, whatever order Canvas returns them in. The report is streamed
+        # from disk and only export values are kept, as tuples in EXPORT_FIELDNAMES order, grouped by section.
+        export_rows_by_section = {}
+        with open(enrollments_path, 'r') as f:
+            for row in csv.DictReader(f):
+                canvas_section_id = row['canvas_section_id']
+                if canvas_section_id not in sis_section_ids:
+                    continue
+                export_rows_by_section.setdefault(canvas_section_id, []).append((
+                    row['canvas_course_id'],
+                    canvas_section_id,
+                    row['section_id'] or sis_section_ids[canvas_section_id],
+                    row['canvas_user_id'],
+                    login_ids_by_canvas_user_id.get(row['canvas_user_id']),
+                    row['user_id'],
+                    row['base_role_type'] if row['role'] in BASE_ROLES else row['role'],
+                    REPORT_SIS_IMPORT_ID if row['created_by_sis'] == 'true' else None,
+                    row['status'],
+                ))
+        for canvas_section_id in sorted(export_rows_by_section):
+            for export_row in export_rows_by_section[canvas_section_id]:
+                canvas_export.writerow(dict(zip(EXPORT_FIELDNAMES, export_row)))
+                enrollment_count += 1
+        return enrollment_count
+
+    def _get_login_ids(self, users_path):
+        if not users_path:
+            return None
+        with open(users_path, 'r') as f:
+            return {r['canvas_user_id']: r['login_id'] for r in csv.DictReader(f)}
+
     @classmethod
     def description(cls):
         return 'Exports per-term Canvas site enrollments to S3.'
@@ -54,15 +54,30 @@ class LtiUsageReportJob(BaseJob):
         # The detailed course navigation usage report is a CSV of tool + course-site rows.
         self.course_to_visible_tools = {}
 
-        account_ids = [app.config['CANVAS_BERKELEY_ACCOUNT_ID']]
-        for r in canvas.get_csv_report('accounts'):
-            account_ids.append(r['canvas_account_id'])
+        # Canvas generates both reports in parallel.
+        reports = dict(canvas.get_csv_reports({
+            'accounts': {'report_type': 'accounts'},
+            'courses': {'report_type': 'courses', 'term_id': sis_term_id},
+        }))
+
+        # Report downloads are read to the end, releasing their connections, before anything else, failures included.
+        report_rows = {key: (None if report is None else list(report)) for key, report in reports.items()}
+        for report_key in ('accounts', 'courses'):
+            if report_rows.get(report_key) is None:
+                raise BackgroundJobError(f'Failed to retrieve CSV {report_key} report.')
+
+        account_ids = [app.config['CANVAS_BERKELEY_ACCOUNT_ID']] + [r['canvas_account_id'] for r in report_rows['accounts']]
+        courses = [c for c in report_rows['courses'] if c['status'] != 'unpublished']
 
         for account_id in account_ids:
             self.merge_account(account_id)
 
-        for course in canvas.get_csv_report('courses', term_id=sis_term_id):
-            self.merge_course(course)
+        # Canvas calls fan out across courses; merging stays on this thread and follows report order.
+        errors = []
+        for course, (tools, tabs) in canvas.fetch_concurrently(self.fetch_course_tools, courses, errors=errors):
+            self.merge_course(course, tools, tabs)
+        if errors:
+            raise BackgroundJobError(f'Failed to retrieve tools for {len(errors)} courses.')
 
         if not self.generate_summary_report(sis_term_id):
             raise BackgroundJobError('Summary report generation failed.')
@@ -74,16 +89,17 @@ class LtiUsageReportJob(BaseJob):
             tool_url = self.merge_tool_definition(tool)
             self.tool_url_to_summary[tool_url]['accounts'].append(str(account_id))
 
-    def merge_course(self, course):
+    def fetch_course_tools(self, course):
         course_id = course['canvas_course_id']
-        if course['status'] == 'unpublished':
-            return
-        for tool in canvas.get_external_tools('course', course_id):
+        return canvas.get_external_tools('course', course_id), canvas.get_tabs(course_id=course_id)
+
+    def merge_course(self, course, tools, tabs):
+        for tool in tools:
             tool_url = self.merge_tool_definition(tool)
             if not tool.course_navigation and tool_url:
                 # This will not appear in course tabs, and so needs to be noted here.
                 self.merge_course_occurrence(course, tool_url)
-        for tab in canvas.get_tabs(course_id=course_id):
+        for tab in tabs:
             if tab.type == 'external' and not getattr(tab, 'hidden', None):
                 m = EXTERNAL_TOOL_ID_PATTERN.match(tab.id)
                 if m:
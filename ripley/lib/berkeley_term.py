@@ -27,8 +27,14 @@ import re
 
 from flask import current_app as app
 from ripley.externals.data_loch import get_current_term
+from ripley.externals.redis import fetch_or_fill_cached_dict_object
 from ripley.lib import util
 
+# Current terms are resolved once per local day (and per term config) and kept both here and in Redis.
+current_terms = {
+    'resolved': (None, None),
+}
+
 
 class BerkeleyTerm:
 
@@ -41,9 +47,23 @@ class BerkeleyTerm:
 
     @classmethod
     def get_current_terms(cls):
-        db_current_term = get_current_term()
         current_term_name = app.config['CANVAS_CURRENT_ENROLLMENT_TERM']
         future_term_name = app.config['CANVAS_FUTURE_ENROLLMENT_TERM']
+        cache_key = f'current_terms:{util.local_today()}:{current_term_name}:{future_term_name}'.replace(' ', '_')
+        resolved_key, terms = current_terms['resolved']
+        if resolved_key != cache_key:
+            canvas_sis_term_ids = fetch_or_fill_cached_dict_object(
+                cache_key,
+                lambda: {k: t.to_canvas_sis_term_id() for k, t in cls._resolve_current_terms(current_term_name, future_term_name).items()},
+                app.config['CURRENT_TERMS_CACHE_EXPIRES_IN_SECONDS'],
+            )
+            terms = {k: cls.from_canvas_sis_term_id(v) for k, v in canvas_sis_term_ids.items()}
+            current_terms['resolved'] = (cache_key, terms)
+        return dict(terms)
+
+    @classmethod
+    def _resolve_current_terms(cls, current_term_name, future_term_name):
+        db_current_term = get_current_term()
 
         if current_term_name == 'auto' and db_current_term:
             current_term_name = db_current_term['term_name']
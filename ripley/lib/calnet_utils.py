@@ -26,8 +26,9 @@ import json
 from os import path
 
 from flask import current_app as app
+from ripley.api.errors import InternalServerError
 from ripley.externals import calnet
-from ripley.externals.data_loch import get_users
+from ripley.externals.data_loch import stream_users
 from ripley.externals.redis import cache_dict_object, fetch_cached_dict_object
 from ripley.lib.util import safe_str
 
@@ -42,7 +43,10 @@ def get_basic_attributes(uids=None):
         remaining_uids = set(u for u in uids if u)
 
     # First, call out the CalNet snapshot in the data loch.
-    for r in get_users(remaining_uids):
+    rows = stream_users(remaining_uids)
+    if rows is None:
+        raise InternalServerError('Failed to retrieve basic attributes from the data loch.')
+    for r in rows:
         if remaining_uids:
             remaining_uids.discard(r['ldap_uid'])
         if (
@@ -118,9 +122,9 @@ def _get_calnet_users(app, uids, search_base=None):
                 users_by_uid[uid] = {'uid': uid}
     else:
         calnet_client = calnet.client(app)
-        calnet_results = calnet_client.search_uids(uids, search_base, use_fallback_mail=True)
+        calnet_results_by_uid = {str(r['uid']): r for r in calnet_client.search_uids(uids, search_base, use_fallback_mail=True)}
         for uid in uids:
-            calnet_result = next((r for r in calnet_results if str(r['uid']) == str(uid)), None)
+            calnet_result = calnet_results_by_uid.get(str(uid))
             if calnet_result:
                 feed = {
                     **_calnet_user_api_feed(calnet_result),
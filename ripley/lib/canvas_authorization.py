@@ -22,15 +22,33 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 "AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
 ENHANCEMENTS, OR MODIFICATIONS.
 """
+from flask import current_app as app
 from ripley.externals import canvas
+from ripley.externals.redis import fetch_or_fill_cached_dict_object
 from ripley.models.admin_user import AdminUser
 
+# The admin roster is cached in Redis as a list of UIDs. The set built from it is kept here, and rebuilt only when the
+# cache hands back a different object.
+canvas_admin_uids = {
+    'cached': None,
+    'uids': frozenset(),
+}
+
 
 def can_administrate_canvas(uid):
-    admins = canvas.get_admins() or False
-    if admins:
-        return bool(next((admin for admin in admins if admin.user['login_id'] == uid), False))
-    return False
+    cached = fetch_or_fill_cached_dict_object(
+        'canvas_admin_uids',
+        _get_canvas_admin_uids,
+        app.config['CANVAS_ADMINS_CACHE_EXPIRES_IN_SECONDS'],
+        stale_seconds=app.config['CANVAS_ADMINS_CACHE_STALE_SECONDS'],
+        background_refresh=True,
+    )
+    if not cached:
+        return False
+    if cached is not canvas_admin_uids['cached']:
+        canvas_admin_uids['uids'] = frozenset(cached['uids'])
+        canvas_admin_uids['cached'] = cached
+    return uid in canvas_admin_uids['uids']
 
 
 def can_manage_mailing_list(canvas_user):
@@ -76,3 +94,15 @@ def is_project_owner(canvas_user):
 
 def _has_any_role(canvas_user, roles):
     return bool(next((e for e in canvas_user.enrollments if e['role'] in roles), None))
+
+
+def _get_canvas_admin_uids():
+    admins = canvas.get_admins()
+    if admins is None:
+        return None
+    try:
+        return {'uids': sorted({admin.user['login_id'] for admin in admins})}
+    except Exception as e:
+        app.logger.error('Failed to page through Canvas admins')
+        app.logger.exception(e)
+        return None
@@ -0,0 +1,80 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from flask import current_app as app
+from ripley.externals import canvas
+from ripley.externals.s3 import download_object, find_recent_dated_csv, get_dated_csv_timestamp, iterate_dated_csv_manifest, \
+    upload_dated_csv
+
+ARCHIVE_FOLDER = 'canvas-provisioning-reports'
+SIS_IMPORTS_FOLDER = 'canvas-sis-imports'
+
+
+def get_provisioning_reports(report_specs, timestamp, archive_suffix):
+    """Download provisioning CSV reports, reusing recent S3 archives where possible.
+
+    Report specs are as in canvas.get_csv_reports, and each must have a 'download_path'. A report archived within
+    CANVAS_PROVISIONING_REPORT_MAX_AGE_SECONDS, and since the latest SIS import, is copied from S3 instead of being
+    regenerated. Reports fresh from Canvas are archived as provisioned-<type>[-<term>]-<archive_suffix>. Yields (key,
+    success) pairs.
+    """
+    max_age_seconds = app.config['CANVAS_PROVISIONING_REPORT_MAX_AGE_SECONDS']
+    latest_sis_import_timestamp = max_age_seconds and _latest_sis_import_timestamp()
+    to_generate = {}
+    for key, report_spec in report_specs.items():
+        archive_name = _archive_name(report_spec)
+        archived_key = max_age_seconds and find_recent_dated_csv(ARCHIVE_FOLDER, archive_name, max_age_seconds)
+        if archived_key and latest_sis_import_timestamp and get_dated_csv_timestamp(archived_key) <= latest_sis_import_timestamp:
+            # Jobs archive reports under their start time, and post SIS imports later on, under the same time.
+            app.logger.info(f"Archived CSV {report_spec['report_type']} report {archived_key} predates the latest SIS import")
+            archived_key = None
+        if archived_key and download_object(archived_key, report_spec['download_path']):
+            app.logger.info(f"Reusing archived CSV {report_spec['report_type']} report {archived_key}")
+            yield key, True
+        else:
+            to_generate[key] = report_spec
+
+    for key, result in canvas.get_csv_reports(to_generate):
+        if result:
+            report_spec = to_generate[key]
+            upload_dated_csv(
+                folder=ARCHIVE_FOLDER,
+                local_name=report_spec['download_path'],
+                remote_name=f'{_archive_name(report_spec)}-{archive_suffix}',
+                timestamp=timestamp,
+            )
+        yield key, bool(result)
+
+
+def _archive_name(report_spec):
+    archive_name = f"provisioned-{report_spec['report_type']}"
+    if report_spec.get('term_id'):
+        archive_name += f"-{report_spec['term_id'].replace(':', '-')}"
+    return archive_name
+
+
+def _latest_sis_import_timestamp():
+    entries = list(iterate_dated_csv_manifest(SIS_IMPORTS_FOLDER))
+    return entries and get_dated_csv_timestamp(entries[-1]['key'])
@@ -29,7 +29,7 @@ from operator import itemgetter
 
 from flask import current_app as app
 from ripley.externals.data_loch import get_edo_enrollment_updates, get_edo_instructor_updates, \
-    get_section_enrollments, get_section_instructors, get_sections
+    get_section_enrollments, get_section_instructors, get_sections, get_term_enrollments, get_term_instructors
 from ripley.lib.berkeley_term import BerkeleyTerm
 from ripley.lib.calnet_utils import get_basic_attributes
 from ripley.lib.canvas_site_utils import csv_formatted_course_role, parse_canvas_sis_section_id, \
@@ -69,6 +69,26 @@ def initialize_recent_updates(sis_term_ids, uids_for_updates):
     return instructor_updates, enrollment_updates
 
 
+def prefetch_term_enrollments(term_id):
+    # A full refresh would otherwise query the loch once per section for students and again for instructors. Instead,
+    # load the whole term in two queries and index rows by campus section id.
+    def _index_by_section(rows, section_id_column):
+        index = {}
+        for row in rows:
+            index.setdefault(str(row[section_id_column]), []).append(row)
+        return index
+
+    enrollments_by_section = _index_by_section(get_term_enrollments(term_id, include_dropped=False, stream=True), 'section_id')
+    instructors_by_section = _index_by_section(get_term_instructors(term_id, stream=True), 'sis_section_id')
+    app.logger.info(
+        f'Prefetched enrollments for {len(enrollments_by_section)} sections and instructors for {len(instructors_by_section)} sections '
+        f'(term_id={term_id}).')
+    return {
+        'enrollments': enrollments_by_section,
+        'instructors': instructors_by_section,
+    }
+
+
 def process_course_enrollments(
     sis_term_id,
     sis_course_id,
@@ -81,6 +101,7 @@ def process_course_enrollments(
     known_users,
     is_incremental,
     primary_sections=None,
+    term_prefetch=None,
 ):
     app.logger.debug(f'Refreshing course {sis_course_id}')
 
@@ -105,6 +126,7 @@ def process_course_enrollments(
             primary_sections,
             known_users,
             is_incremental,
+            term_prefetch,
         )
 
 
@@ -128,6 +150,7 @@ def _process_section_enrollments(
     primary_sections,
     known_users,
     is_incremental,
+    term_prefetch=None,
 ):
     app.logger.debug(f'Refreshing section: {sis_section_id}')
 
@@ -151,6 +174,7 @@ def _process_section_enrollments(
         existing_section_enrollments,
         known_users,
         is_incremental,
+        term_prefetch,
     )
     _process_instructor_enrollments(
         sis_term_id,
@@ -162,6 +186,7 @@ def _process_section_enrollments(
         existing_section_enrollments,
         known_users,
         is_incremental,
+        term_prefetch,
     )
     # Remove existing enrollments not found in SIS
     for ldap_uid, enrollment_rows in existing_section_enrollments.items():
@@ -185,12 +210,18 @@ def _process_student_enrollments(
     existing_section_enrollments,
     known_users,
     is_incremental,
+    term_prefetch=None,
 ):
     section_id, berkeley_term = parse_canvas_sis_section_id(sis_section_id)
     if is_incremental:
         enrollment_rows = section_enrollment_updates
     else:
-        enrollment_rows = get_section_enrollments(berkeley_term.to_sis_term_id(), [section_id], include_dropped=False)
+        term_id = berkeley_term.to_sis_term_id()
+        prefetched = _get_term_prefetch(term_prefetch, term_id)
+        if prefetched is not None:
+            enrollment_rows = prefetched['enrollments'].get(str(section_id), [])
+        else:
+            enrollment_rows = get_section_enrollments(term_id, [section_id], include_dropped=False)
     app.logger.debug(f'{len(enrollment_rows)} student enrollments found for section {sis_section_id}')
 
     # Course provising jobs won't pass in a prepopulated array of known users, so construct a dictionary if needed.
@@ -223,12 +254,18 @@ def _process_instructor_enrollments(
     existing_section_enrollments,
     known_users,
     is_incremental,
+    term_prefetch=None,
 ):
     section_id, berkeley_term = parse_canvas_sis_section_id(sis_section_id)
     if is_incremental:
         instructor_rows = section_instructor_updates
     else:
-        instructor_rows = get_section_instructors(berkeley_term.to_sis_term_id(), [section_id])
+        term_id = berkeley_term.to_sis_term_id()
+        prefetched = _get_term_prefetch(term_prefetch, term_id)
+        if prefetched is not None:
+            instructor_rows = prefetched['instructors'].get(str(section_id), [])
+        else:
+            instructor_rows = get_section_instructors(term_id, [section_id])
     app.logger.debug(f'{len(instructor_rows)} instructor enrollments found for section {sis_section_id}')
     for instructor_row in instructor_rows:
         course_role = _determine_instructor_role(sis_section_id, primary_sections, instructor_row['instructor_role_code'])
@@ -245,6 +282,15 @@ def _process_instructor_enrollments(
             )
 
 
+def _get_term_prefetch(term_prefetch, term_id):
+    # The prefetch cache is keyed by campus term, since a section's own term need not match the term being refreshed.
+    if term_prefetch is None:
+        return None
+    if term_id not in term_prefetch:
+        term_prefetch[term_id] = prefetch_term_enrollments(term_id)
+    return term_prefetch[term_id]
+
+
 def _process_section_enrollment(sis_term_id, sis_course_id, sis_section_id, ldap_uid, course_role, csv_set, existing_enrollments, known_users):
     enrollment_csv = csv_set.enrollment_terms[sis_term_id]
     existing_user_enrollments = existing_enrollments.get(str(ldap_uid), None)
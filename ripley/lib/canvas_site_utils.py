@@ -340,6 +340,7 @@ def update_canvas_sections(course, all_section_ids, section_ids_to_remove, secti
         if not sis_import:
             raise InternalServerError(f'Course sections SIS import failed (canvas_site_id={course.id}).')
 
+        canvas.invalidate_course_context(course.id)
         # We need the complete list of site sections, including those we're not updating, in order to pass on a
         # complete list of primary sections in the course.
         all_site_official_sections, all_site_section_ids, all_site_sis_sections = get_official_sections(course.id)
@@ -150,7 +150,7 @@ def canvas_user_profile_to_api_json(canvas_user_profile, uid, canvas_site_id=Non
         'isCanvasAdmin': can_administrate_canvas(uid),
     }
     if canvas_site_id:
-        course = canvas.get_course(course_id=canvas_site_id)
+        course = canvas.get_cached_course(canvas_site_id)
         if course:
             api_json.update({
                 'canvasSiteId': canvas_site_id,
@@ -138,6 +138,7 @@ def provision_course_site(uid, site_name, site_abbreviation, term_slug, section_
         sis_import = canvas.post_sis_import(attachment=sections_csv.tempfile.name)
         if not sis_import:
             raise InternalServerError(f'Course sections SIS import failed (canvas_site_id={course.id}).')
+        canvas.invalidate_course_context(course.id)
 
     if not is_admin_by_ccns:
         canvas_sis_section_id = canvas_section_payload[0]['section_id']
@@ -195,6 +196,8 @@ def _get_canvas_user_profile(course, uid):
     canvas_user_profile = canvas.get_canvas_user_profile_by_uid(uid)
     if not canvas_user_profile:
         user_result = data_loch.get_users(uids=[uid])
+        if user_result is None:
+            raise InternalServerError(f'Failed to retrieve instructor from the data loch (uid={uid}).')
         if user_result:
             with SisImportCsv.create(['user_id', 'login_id', 'first_name', 'last_name', 'email', 'status']) as users_csv:
                 users_csv.writerow(csv_row_for_campus_user(user_result[0]))
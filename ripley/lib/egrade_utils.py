@@ -36,7 +36,7 @@ def prepare_egrades_export(canvas_site_id, grade_type, pnp_cutoff, section_id, t
     app.logger.warning(f'E-Grades job started for course {canvas_site_id}')
     official_grades = []
     canvas_section_id = None
-    for canvas_course_section in canvas.get_course_sections(canvas_site_id):
+    for canvas_course_section in canvas.get_cached_course_sections(canvas_site_id):
         berkeley_section_id, berkeley_term = parse_canvas_sis_section_id(canvas_course_section.sis_section_id)
         if berkeley_section_id == section_id:
             canvas_section_id = canvas_course_section.id
@@ -119,7 +119,7 @@ def _get_canvas_course_student_grades(canvas_site_id, section_id, term_id):
     enrollments = data_loch.get_basic_profile_and_grades_per_enrollments(term_id=term_id, section_ids=[section_id])
     loch_enrollments_by_uid = {e['ldap_uid']: e for e in enrollments}
     students = []
-    for canvas_section in canvas.get_course_sections(canvas_site_id):
+    for canvas_section in canvas.get_cached_course_sections(canvas_site_id):
         next_section_id, berkeley_term = parse_canvas_sis_section_id(canvas_section.sis_section_id)
         if section_id == next_section_id:
             for canvas_enrollment in canvas.get_section(canvas_section.id, api_call=False).get_enrollments():
@@ -24,11 +24,18 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 import logging
 import re
+from threading import Lock
 import urllib
 
 from flask import current_app as app, redirect, Response
 import requests
+from requests.adapters import HTTPAdapter
 import simplejson as json
+from urllib3.util.retry import Retry
+
+# Outgoing requests share a keep-alive session, so repeated calls to the same host reuse warm connections.
+pooled_session = None
+pooled_session_lock = Lock()
 
 
 class ResponseExceptionWrapper:
@@ -55,6 +62,32 @@ def add_param_to_url(url, param):
     return urllib.parse.urlunparse(parsed_url._replace(query=urllib.parse.urlencode(parsed_query)))
 
 
+def mount_pooled_adapter(session):
+    # Retries apply only to idempotent methods (urllib3 default), so a failed POST is never silently repeated.
+    retry = Retry(
+        total=app.config['HTTP_MAX_RETRIES'],
+        backoff_factor=app.config['HTTP_RETRY_BACKOFF_FACTOR'],
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=app.config['HTTP_POOL_CONNECTIONS'],
+        pool_maxsize=app.config['HTTP_POOL_MAXSIZE'],
+        max_retries=retry,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_pooled_session():
+    global pooled_session
+    with pooled_session_lock:
+        if pooled_session is None:
+            pooled_session = mount_pooled_adapter(requests.Session())
+    return pooled_session
+
+
 def redirect_unauthorized(user):
     name = (user.name or f'UID {user.uid}') if user else 'user'
     redirect_path = add_param_to_url('/error', ('error', f'Sorry, {name} is not authorized to use this tool.'))
@@ -82,7 +115,7 @@ def request(url, headers={}, method='get', auth=None, auth_params=None, data=Non
             urllib_logger = logging.getLogger('urllib3')
             saved_level = urllib_logger.level
             urllib_logger.setLevel(logging.INFO)
-        http_method = getattr(requests, method)
+        http_method = getattr(get_pooled_session(), method)
         timeout = timeout or 60
         response = http_method(url, headers=headers, auth=auth, params=auth_params, data=data, timeout=timeout, **kwargs)
         if auth_params:
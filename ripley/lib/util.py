@@ -23,9 +23,10 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 from datetime import datetime
+from functools import wraps
 
 from dateutil.tz import tzutc
-from flask import current_app as app
+from flask import current_app as app, has_request_context, request
 import pytz
 
 
@@ -41,6 +42,38 @@ def local_today():
     return utc_now().astimezone(default_timezone()).date()
 
 
+def request_memoized(func):
+    # Results are kept on the request, keyed by function and arguments, so repeated lookups within one request (e.g., a
+    # role check followed by the handler itself) cost a single call. Outside a request the function is called as usual.
+    @wraps(func)
+    def _request_memoized(*args, **kwargs):
+        if not has_request_context():
+            return func(*args, **kwargs)
+        memo = _request_memo()
+        # Arguments are keyed by their string form: a Canvas site ID taken from the URL is a str, but from the session an
+        # int. This also allows unhashable arguments.
+        key = (
+            func.__module__,
+            func.__qualname__,
+            tuple(str(arg) for arg in args),
+            tuple((k, str(v)) for k, v in sorted(kwargs.items())),
+        )
+        if key not in memo:
+            memo[key] = func(*args, **kwargs)
+        return memo[key]
+    return _request_memoized
+
+
+def clear_request_memo(func=None):
+    if has_request_context():
+        memo = _request_memo()
+        if func:
+            for key in [k for k in memo if k[0:2] == (func.__module__, func.__qualname__)]:
+                del memo[key]
+        else:
+            memo.clear()
+
+
 def safe_str(value):
     return str(value) if value else None
 
@@ -86,3 +119,11 @@ def utc_now():
 
 def get_eb_environment():
     return app.config['EB_ENVIRONMENT'] if 'EB_ENVIRONMENT' in app.config else None
+
+
+def _request_memo():
+    # Not flask.g, which lasts as long as the app context and so can outlive the request.
+    memo = getattr(request, 'ripley_request_memo', None)
+    if memo is None:
+        memo = request.ripley_request_memo = {}
+    return memo
@@ -42,9 +42,11 @@ class AdminUser(db.Model):
 
     @classmethod
     def create(cls, uid):
+        from ripley.models.user import delete_cached_user_profiles
         admin_user = cls(uid=uid)
         db.session.add(admin_user)
         std_commit()
+        delete_cached_user_profiles(uid)
         return admin_user
 
     @classmethod
@@ -27,6 +27,7 @@ import re
 
 from flask import current_app as app
 from ripley import db, std_commit
+from ripley.api.errors import InternalServerError
 from ripley.externals import canvas, data_loch
 from ripley.lib.berkeley_term import BerkeleyTerm
 from ripley.lib.canvas_authorization import has_instructing_role, is_project_maintainer, is_project_owner
@@ -239,7 +240,10 @@ class MailingList(Base):
         for chunk in range(0, len(active_canvas_site_users), count_per_chunk):
             canvas_user_chunk = canvas_site_users[chunk:chunk + count_per_chunk]
             uids = [u.login_id for u in filter(lambda u: hasattr(u, 'login_id'), canvas_user_chunk)]
-            loch_users_by_uid = {u['ldap_uid']: u for u in data_loch.get_users(uids=uids)}
+            loch_users = data_loch.get_users(uids=uids)
+            if loch_users is None:
+                raise InternalServerError(f'Failed to retrieve users from the data loch (mailing_list_id={mailing_list.id}).')
+            loch_users_by_uid = {u['ldap_uid']: u for u in loch_users}
 
             for course_user in canvas_user_chunk:
                 uid = course_user.login_id if hasattr(course_user, 'login_id') else None
@@ -28,7 +28,8 @@ from flask import current_app as app
 from flask_login import UserMixin
 from ripley.externals import canvas
 from ripley.externals.data_loch import get_student_profile, has_instructor_history
-from ripley.externals.redis import cache_dict_object, delete_cache_key, fetch_cached_dict_object
+from ripley.externals.redis import cache_dict_object, delete_cache_key, delete_indexed_cache_keys, fetch_cached_dict_object, \
+    fetch_or_fill_cached_dict_object, index_cache_key
 from ripley.lib.berkeley_term import BerkeleyTerm
 from ripley.lib.calnet_utils import get_calnet_user_for_uid
 from ripley.lib.canvas_user_utils import canvas_user_profile_to_api_json
@@ -38,14 +39,15 @@ from ripley.models.admin_user import AdminUser
 
 class User(UserMixin):
 
-    def __init__(self, serialized_composite_key=None, canvas_user_profile=None):
+    def __init__(self, serialized_composite_key=None, canvas_user_profile=None, refresh=False):
         composite_key = json.loads(serialized_composite_key) if serialized_composite_key else {}
         self.uid = to_str(to_int(composite_key.get('uid')))
         if self.uid:
-            self.user = self._load_user(
+            self.user = self._load_cached_user(
                 canvas_masquerading_user_id=composite_key.get('canvas_masquerading_user_id', None),
                 canvas_site_id=to_int(composite_key.get('canvas_site_id')),
                 canvas_user_profile=canvas_user_profile,
+                refresh=refresh,
             )
         else:
             self.user = self._load_user()
@@ -141,6 +143,7 @@ class User(UserMixin):
         if self.user and self.uid:
             cache_key = _get_cache_key(canvas_site_id=self.canvas_site_id, uid=self.uid)
             delete_cache_key(cache_key)
+            delete_cached_user_profiles(self.uid)
         self.uid = None
         self.user = self._load_user()
 
@@ -193,6 +196,38 @@ class User(UserMixin):
                 cache_dict_object(cache_key, canvas_user_data, 120)
         return canvas_user_data
 
+    def _load_cached_user(self, canvas_masquerading_user_id=None, canvas_site_id=None, canvas_user_profile=None, refresh=False):
+        cache_key = f'user_profile:{self.uid}:{canvas_site_id}'
+        cache_seconds = app.config['USER_PROFILE_CACHE_EXPIRES_IN_SECONDS'] + app.config['USER_PROFILE_CACHE_STALE_SECONDS']
+        uid = self.uid
+
+        def _load_user_profile():
+            # Background refreshes run on a detached User, so that logout() on this one cannot change whose profile is loaded.
+            detached_user = User()
+            detached_user.uid = uid
+            # Indexed before the profile is cached, so that delete_cached_user_profiles cannot miss it.
+            index_cache_key(_get_profile_index_key(uid), cache_key, cache_seconds)
+            return detached_user._load_user(canvas_site_id=canvas_site_id, canvas_user_profile=canvas_user_profile)
+
+        if refresh or canvas_user_profile:
+            # Logins and LTI launches decide access, so they recompute the profile rather than trust a cached one.
+            user = _load_user_profile()
+            cache_dict_object(
+                cache_key,
+                user,
+                cache_seconds,
+                local_expire_seconds=app.config['USER_PROFILE_CACHE_EXPIRES_IN_SECONDS'],
+            )
+        else:
+            user = fetch_or_fill_cached_dict_object(
+                cache_key,
+                _load_user_profile,
+                app.config['USER_PROFILE_CACHE_EXPIRES_IN_SECONDS'],
+                stale_seconds=app.config['USER_PROFILE_CACHE_STALE_SECONDS'],
+                background_refresh=True,
+            )
+        return {**user, 'canvasMasqueradingUserId': canvas_masquerading_user_id}
+
     def _load_user(self, canvas_masquerading_user_id=None, canvas_site_id=None, canvas_user_profile=None):
         calnet_profile = None
         can_access_standalone_view = False
@@ -249,8 +284,16 @@ class User(UserMixin):
         return dict(sorted(api_json.items()))
 
 
+def delete_cached_user_profiles(uid):
+    delete_indexed_cache_keys(_get_profile_index_key(uid))
+
+
 def _get_cache_key(canvas_site_id, uid):
     if uid:
         return f'user_session_{uid}_{canvas_site_id}' if canvas_site_id else f'user_session_{uid}'
     else:
         return None
+
+
+def _get_profile_index_key(uid):
+    return f'user_profile_keys:{uid}'
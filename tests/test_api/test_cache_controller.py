@@ -0,0 +1,94 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from ripley.externals.redis import cache_dict_object
+from tests.util import enable_redis_cache
+
+admin_uid = '10000'
+non_admin_uid = '10001'
+
+
+class TestCacheNamespaces:
+
+    def test_anonymous(self, client):
+        """Denies anonymous user."""
+        _api_get_namespaces(client, expected_status_code=401)
+
+    def test_unauthorized(self, client, fake_auth):
+        """Denies unauthorized user."""
+        fake_auth.login(canvas_site_id=None, uid=non_admin_uid)
+        _api_get_namespaces(client, expected_status_code=401)
+
+    def test_authorized(self, client, fake_auth):
+        fake_auth.login(canvas_site_id=None, uid=admin_uid)
+        assert _api_get_namespaces(client) == []
+
+    def test_key_counts(self, app, client, fake_auth):
+        fake_auth.login(canvas_site_id=None, uid=admin_uid)
+        with enable_redis_cache(app):
+            cache_dict_object('grade_distribution/1', {'a': 1}, 60)
+            cache_dict_object('grade_distribution/2', {'b': 2}, 60)
+            namespaces = {n['name']: n for n in _api_get_namespaces(client)}
+            assert namespaces['grade_distribution']['keyCount'] == 2
+            assert namespaces['grade_distribution']['pattern'] == 'grade_distribution/*'
+            assert namespaces['canvas_external_tools']['keyCount'] == 0
+
+
+class TestDeleteCacheNamespace:
+
+    def test_unauthorized(self, client, fake_auth):
+        """Denies unauthorized user."""
+        fake_auth.login(canvas_site_id=None, uid=non_admin_uid)
+        _api_delete_namespace(client, 'grade_distribution', expected_status_code=401)
+
+    def test_unknown_namespace(self, client, fake_auth):
+        fake_auth.login(canvas_site_id=None, uid=admin_uid)
+        _api_delete_namespace(client, 'nostromo', expected_status_code=404)
+
+    def test_authorized(self, client, fake_auth):
+        fake_auth.login(canvas_site_id=None, uid=admin_uid)
+        assert _api_delete_namespace(client, 'grade_distribution')['deleted'] is True
+
+    def test_deleted_count(self, app, client, fake_auth):
+        fake_auth.login(canvas_site_id=None, uid=admin_uid)
+        with enable_redis_cache(app) as redis_conn:
+            cache_dict_object('grade_distribution/1', {'a': 1}, 60)
+            cache_dict_object('grade_distribution/2', {'b': 2}, 60)
+            cache_dict_object('canvas_external_tools', {'tools': []}, 60)
+            assert _api_delete_namespace(client, 'grade_distribution') == {'deleted': True, 'count': 2}
+            assert redis_conn.keys('grade_distribution/*') == []
+            assert redis_conn.get('canvas_external_tools')
+
+
+def _api_delete_namespace(client, name, expected_status_code=200):
+    response = client.get(f'/api/cache/delete_namespace/{name}')
+    assert response.status_code == expected_status_code
+    return response.json
+
+
+def _api_get_namespaces(client, expected_status_code=200):
+    response = client.get('/api/cache/namespaces')
+    assert response.status_code == expected_status_code
+    return response.json
@@ -27,10 +27,12 @@ from datetime import timedelta
 
 import requests_mock
 from ripley import db, std_commit
+from ripley.externals import data_loch
+from ripley.externals.redis import fetch_cached_dict_object, fetch_or_fill_cached_dict_object
 from ripley.jobs.house_keeping_job import HouseKeepingJob
 from ripley.lib.util import utc_now
 from ripley.models.job_history import JobHistory
-from tests.util import register_canvas_uris
+from tests.util import enable_redis_cache, register_canvas_uris
 
 
 class TestStatusController:
@@ -78,6 +80,65 @@ class TestStatusController:
             assert response.json['job_manager'] is expectation
 
 
+class TestCacheStatsController:
+    """Cache stats API."""
+
+    admin_uid = '10000'
+    non_admin_uid = '10001'
+
+    def test_anonymous(self, client):
+        """Denies anonymous user."""
+        _api_ping_cache(client, expected_status_code=401)
+
+    def test_unauthorized(self, client, fake_auth):
+        """Denies unauthorized user."""
+        fake_auth.login(canvas_site_id=None, uid=self.non_admin_uid)
+        _api_ping_cache(client, expected_status_code=401)
+
+    def test_authorized(self, client, fake_auth):
+        fake_auth.login(canvas_site_id=None, uid=self.admin_uid)
+        assert _api_ping_cache(client) == {}
+
+    def test_counters(self, app, client, fake_auth):
+        fake_auth.login(canvas_site_id=None, uid=self.admin_uid)
+        with enable_redis_cache(app):
+            fetch_or_fill_cached_dict_object('grade_distribution/1', lambda: {'a': 1}, 60)
+            fetch_cached_dict_object('grade_distribution/1')
+            stats = _api_ping_cache(client)['grade_distribution']
+            assert stats['misses'] == 1
+            assert stats['hits'] == 1
+            assert stats['fills'] == 1
+            assert stats['writes'] == 1
+            assert stats['hitRate'] == 0.5
+            assert stats['averageFillSeconds'] is not None
+
+
+class TestDataLochStatsController:
+    """Data loch query stats API."""
+
+    admin_uid = '10000'
+    non_admin_uid = '10001'
+
+    def test_anonymous(self, client):
+        """Denies anonymous user."""
+        _api_ping_data_loch(client, expected_status_code=401)
+
+    def test_unauthorized(self, client, fake_auth):
+        """Denies unauthorized user."""
+        fake_auth.login(canvas_site_id=None, uid=self.non_admin_uid)
+        _api_ping_data_loch(client, expected_status_code=401)
+
+    def test_authorized(self, client, fake_auth):
+        fake_auth.login(canvas_site_id=None, uid=self.admin_uid)
+        data_loch.get_current_term()
+        stats = _api_ping_data_loch(client)['get_current_term']
+        assert stats['count'] >= 1
+        assert stats['rows'] >= 1
+        assert stats['errors'] == 0
+        assert sum(stats['histogram'].values()) == stats['count']
+        assert stats['averageSeconds'] is not None
+
+
 class TestRqStatusController:
     """RQ status API."""
 
@@ -101,6 +162,18 @@ class TestRqStatusController:
         assert response['queue'] == {'name': 'default', 'jobCount': 0}
 
 
+def _api_ping_cache(client, expected_status_code=200):
+    response = client.get('/api/ping/cache')
+    assert response.status_code == expected_status_code
+    return response.json
+
+
+def _api_ping_data_loch(client, expected_status_code=200):
+    response = client.get('/api/ping/data_loch')
+    assert response.status_code == expected_status_code
+    return response.json
+
+
 def _api_ping_rq(client, expected_status_code=200):
     response = client.get('/api/ping/rq')
     assert response.status_code == expected_status_code
@@ -0,0 +1,70 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+import re
+from unittest import mock
+
+import pytest
+from ripley.api.errors import InternalServerError
+from ripley.externals import calnet
+from ripley.lib import calnet_utils
+
+
+class TestCalnet:
+
+    def test_search_uids_batched(self, app):
+        uids = [str(uid) for uid in range(10000, 10250)]
+        calnet.batch_query_size = calnet.BATCH_QUERY_INITIAL
+
+        def _search(search_filter, search_base=None, use_fallback_mail=False):
+            return [{'uid': uid} for uid in re.findall('\\(uid=(\\d+)\\)', search_filter)]
+
+        with mock.patch.object(calnet.Client, '_search', side_effect=_search) as search:
+            results = calnet.client(app).search_uids(uids)
+            assert sorted(r['uid'] for r in results) == uids
+            assert search.call_count < len(uids) / calnet.BATCH_QUERY_INITIAL
+            assert calnet.batch_query_size > calnet.BATCH_QUERY_INITIAL
+
+    def test_search_uids_failed_batch_retried(self, app):
+        uids = [str(uid) for uid in range(10000, 10040)]
+        calnet.batch_query_size = calnet.BATCH_QUERY_INITIAL
+
+        def _search(search_filter, search_base=None, use_fallback_mail=False):
+            batch_uids = re.findall('\\(uid=(\\d+)\\)', search_filter)
+            if len(batch_uids) > calnet.BATCH_QUERY_MINIMUM:
+                raise calnet.LDAPError('Sizelimit exceeded')
+            return [{'uid': uid} for uid in batch_uids]
+
+        with mock.patch.object(calnet.Client, '_search', side_effect=_search):
+            results = calnet.client(app).search_uids(uids)
+            assert sorted(r['uid'] for r in results) == uids
+            assert calnet.batch_query_size < calnet.BATCH_QUERY_INITIAL
+
+    def test_basic_attributes_loch_failure(self, app, monkeypatch):
+        monkeypatch.setattr(calnet_utils, 'stream_users', lambda uids=None: None)
+        with mock.patch('ripley.lib.calnet_utils.get_calnet_attributes_for_uids') as ldap_search:
+            with pytest.raises(InternalServerError):
+                calnet_utils.get_basic_attributes(['10000'])
+            assert ldap_search.call_count == 0
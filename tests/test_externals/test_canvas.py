@@ -0,0 +1,169 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+import io
+from types import SimpleNamespace
+
+from canvasapi.course import Course
+from requests import Response
+from ripley.externals import canvas
+from tests.util import enable_redis_cache
+from urllib3.response import HTTPResponse
+
+
+def _response(status_code=200, remaining=None, cost=None, content=b''):
+    response = Response()
+    response.status_code = status_code
+    response._content = content
+    if remaining is not None:
+        response.headers['X-Rate-Limit-Remaining'] = str(remaining)
+    if cost is not None:
+        response.headers['X-Request-Cost'] = str(cost)
+    return response
+
+
+def _streamed_report(content):
+    response = Response()
+    response.status_code = 200
+    response.raw = HTTPResponse(body=io.BytesIO(content), preload_content=False)
+    return response
+
+
+class TestReportRows:
+
+    def test_response_closed_when_read_through(self, app):
+        response = _streamed_report(b'canvas_account_id,name\n1,Berkeley\n2,Extension\n')
+        assert [r['name'] for r in canvas.ReportRows(response)] == ['Berkeley', 'Extension']
+        assert response.raw.closed
+
+    def test_response_closed_when_abandoned(self, app):
+        response = _streamed_report(b'canvas_account_id,name\n1,Berkeley\n2,Extension\n')
+        with canvas.ReportRows(response) as report_rows:
+            rows = iter(report_rows)
+            assert next(rows)['name'] == 'Berkeley'
+        assert response.raw.closed
+        response = _streamed_report(b'canvas_account_id,name\n1,Berkeley\n')
+        with canvas.ReportRows(response):
+            pass
+        assert response.raw.closed
+
+
+class TestCanvasThrottle:
+
+    def test_fetch_concurrently_preserves_order(self, app):
+        results = list(canvas.fetch_concurrently(lambda i: i * i, range(20), max_workers=4))
+        assert results == [(i, i * i) for i in range(20)]
+
+    def test_fetch_concurrently_collects_errors(self, app):
+        def _square(i):
+            if i % 5 == 3:
+                raise ValueError(i)
+            return i * i
+        errors = []
+        results = list(canvas.fetch_concurrently(_square, range(10), max_workers=4, errors=errors))
+        assert results == [(i, i * i) for i in range(10) if i % 5 != 3]
+        assert [(i, str(e)) for i, e in errors] == [(3, '3'), (8, '8')]
+
+    def test_throttle_scoped_to_fetch(self, app, monkeypatch):
+        def _sleep(seconds):
+            raise AssertionError('Throttle slept outside a concurrent fetch')
+        monkeypatch.setattr(canvas, 'sleep', _sleep)
+        throttled = _response(status_code=403, content=b'403 Forbidden (Rate Limit Exceeded)')
+        assert canvas._on_canvas_response(throttled) is throttled
+
+        throttles = list(canvas.fetch_concurrently(lambda i: canvas.canvas_throttle_context.throttle, range(4), max_workers=2))
+        assert len({id(t) for _, t in throttles}) == 1
+        other_throttle = next(canvas.fetch_concurrently(lambda i: canvas.canvas_throttle_context.throttle, [0]))[1]
+        assert other_throttle is not throttles[0][1]
+        assert getattr(canvas.canvas_throttle_context, 'throttle', None) is None
+
+    def test_concurrency_adapts_to_rate_limit(self, app):
+        throttle = canvas.CanvasThrottle()
+        throttle.configure(8)
+        throttle.on_response(_response(remaining=100, cost=1.5))
+        assert throttle.limit == 4
+        throttle.on_response(_response(remaining=300, cost=1.5))
+        assert throttle.limit == 3
+        throttle.on_response(_response(remaining=650, cost=0.5))
+        assert throttle.limit == 4
+
+    def test_ignores_responses_without_rate_limit_headers(self, app):
+        throttle = canvas.CanvasThrottle()
+        throttle.configure(8)
+        throttle.on_response(_response(status_code=404))
+        assert throttle.limit == 8
+
+
+class TestCachedCourse:
+
+    def test_course_context_shared_until_invalidated(self, app, monkeypatch):
+        calls = []
+
+        def _get_course(canvas_site_id):
+            calls.append(canvas_site_id)
+            return Course(None, {'id': canvas_site_id, 'name': f'Course {len(calls)}', 'start_at': '2024-01-16T08:00:00Z'})
+        monkeypatch.setattr(canvas, 'get_course', _get_course)
+        with enable_redis_cache(app):
+            assert canvas.get_cached_course(1234567).name == 'Course 1'
+            course = canvas.get_cached_course(1234567)
+            assert course.name == 'Course 1'
+            assert course.start_at_date.year == 2024
+            assert calls == [1234567]
+            canvas.invalidate_course_context(1234567)
+            assert canvas.get_cached_course(1234567).name == 'Course 2'
+            assert calls == [1234567, 1234567]
+
+    def test_invalidation_scoped_to_site(self, app, monkeypatch):
+        calls = []
+
+        def _get_course(canvas_site_id):
+            calls.append(canvas_site_id)
+            return Course(None, {'id': canvas_site_id, 'name': f'Course {canvas_site_id}'})
+        monkeypatch.setattr(canvas, 'get_course', _get_course)
+        with enable_redis_cache(app):
+            canvas.get_cached_course(12)
+            canvas.get_cached_course(123)
+            canvas.invalidate_course_context(12)
+            canvas.get_cached_course(12)
+            canvas.get_cached_course(123)
+            assert calls == [12, 123, 12]
+
+
+class TestCourseUser:
+
+    def test_memoized_across_site_id_types(self, app, monkeypatch):
+        calls = []
+
+        def _get_course(course_id, api_call=True):
+            def _get_user(user_id, include=None):
+                calls.append((course_id, user_id))
+                return SimpleNamespace(enrollments=[{'role': 'TeacherEnrollment'}])
+            return SimpleNamespace(get_user=_get_user)
+        monkeypatch.setattr(canvas, 'get_course', _get_course)
+        with app.test_request_context():
+            # Role checks get the site ID from the URL, as a str; session loading gets it from the session, as an int.
+            canvas.get_course_user('1234567', 9876543)
+            canvas.get_course_user(1234567, 9876543)
+            assert calls == [('1234567', 9876543)]
@@ -24,10 +24,13 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 from datetime import date
+from threading import BoundedSemaphore
 
+from psycopg2.pool import PoolError
 import pytest
 from ripley.externals import data_loch
 from ripley.lib import util
+from tests.util import execute_loch_fixture_sql, override_config
 
 admin_uid = '10000'
 no_canvas_account_uid = '10001'
@@ -70,6 +73,83 @@ class TestDataLoch:
         rosters = data_loch.get_section_enrollments('2232', ['32936', '32937'])
         assert len(rosters) == 5
 
+    def test_get_term_enrollments(self):
+        section_enrollments = data_loch.get_section_enrollments('2232', ['32936', '32937'])
+        term_enrollments = data_loch.get_term_enrollments('2232')
+        assert len(term_enrollments) >= len(section_enrollments)
+        for row in section_enrollments:
+            assert row in term_enrollments
+
+    def test_get_term_instructors(self):
+        section_instructors = data_loch.get_section_instructors('2232', ['32936'])
+        term_instructors = data_loch.get_term_instructors('2232')
+        assert len(section_instructors)
+        for row in section_instructors:
+            assert row in term_instructors
+
+    def test_cached_sections(self, app):
+        def _cache_hits():
+            return data_loch.get_query_stats().get('get_sections', {}).get('cacheHits', 0)
+        with override_config(app, 'DATA_LOCH_QUERY_CACHE_SECONDS', 3600):
+            sections = data_loch.get_sections('2232', ['32936'])
+            assert len(sections)
+            sections[0]['section_id'] = 'modified'
+            hits = _cache_hits()
+            cached_sections = data_loch.get_sections('2232', ['32936'])
+            assert _cache_hits() == hits + 1
+            assert cached_sections[0]['section_id'] == '32936'
+            data_loch.get_sections('2232', ['32937'])
+            assert _cache_hits() == hits + 1
+
+    def test_cache_dropped_on_sis_refresh(self, app):
+        def _query_count():
+            return data_loch.get_query_stats().get('get_sections', {}).get('count', 0)
+        with override_config(app, 'DATA_LOCH_QUERY_CACHE_SECONDS', 3600), override_config(app, 'DATA_LOCH_REFRESH_CHECK_SECONDS', 0):
+            data_loch.get_sections('2232', ['32936'])
+            query_count = _query_count()
+            data_loch.get_sections('2232', ['32936'])
+            assert _query_count() == query_count
+            execute_loch_fixture_sql(app, """INSERT INTO sis_data.edo_enrollment_updates
+                (sis_term_id, sis_section_id, ldap_uid, sis_id, sis_enrollment_status, course_career, last_updated)
+                VALUES ('2232', '32936', '99999', '30099999', 'E', 'UGRD', '2999-01-01 00:00:00')""")
+            try:
+                assert data_loch.get_sections('2232', ['32936'])[0]['section_id'] == '32936'
+                assert _query_count() == query_count + 1
+                data_loch.get_sections('2232', ['32936'])
+                assert _query_count() == query_count + 1
+            finally:
+                execute_loch_fixture_sql(app, "DELETE FROM sis_data.edo_enrollment_updates WHERE ldap_uid = '99999'")
+
+    def test_stream_term_enrollments(self):
+        term_enrollments = data_loch.get_term_enrollments('2232')
+        assert list(data_loch.get_term_enrollments('2232', stream=True)) == term_enrollments
+
+    def test_get_users_in_chunks(self, app):
+        uids = [admin_uid, teacher_uid, student_uid]
+        expected = sorted(u['ldap_uid'] for u in data_loch.get_users(uids))
+        with override_config(app, 'DATA_LOCH_UID_CHUNK_SIZE', 1):
+            assert sorted(u['ldap_uid'] for u in data_loch.get_users(uids)) == expected
+        assert data_loch.get_users([]) == []
+
+    def test_stream_users(self):
+        assert sorted(u['ldap_uid'] for u in data_loch.stream_users()) == sorted(u['ldap_uid'] for u in data_loch.get_users())
+        streamed = list(data_loch.stream_users([teacher_uid, student_uid]))
+        assert sorted(u['ldap_uid'] for u in streamed) == [teacher_uid, student_uid]
+        full_rows_by_uid = {u['ldap_uid']: u for u in data_loch.get_users([teacher_uid, student_uid])}
+        for row in streamed:
+            assert isinstance(row, data_loch.BasicAttributesRow)
+            full_row = full_rows_by_uid[row['ldap_uid']]
+            assert dict(row) == {k: full_row[k] for k in row.keys()}
+            assert row.get('person_type') == full_row['person_type']
+            # Columns are not attributes, as with dict rows.
+            assert getattr(row, 'person_type', None) is None
+        assert list(data_loch.stream_users([])) == []
+
+    def test_stream_users_failure(self, monkeypatch):
+        monkeypatch.setattr(data_loch, 'safe_execute_rds', lambda *args, **kwargs: None)
+        assert data_loch.get_users([teacher_uid]) is None
+        assert data_loch.stream_users([teacher_uid]) is None
+
     def test_get_undergraduate_term(self, app):
         term = data_loch.get_undergraduate_term('2228')
         assert len(term) == 1
@@ -93,3 +173,32 @@ class TestDataLoch:
         results = data_loch.find_person_by_uid('30000')
         assert len(results) == 1
         assert results[0]['ldap_uid'] == '30000'
+
+
+class TestConnectionPool:
+
+    def test_exhausted_pool_error_not_masked(self, app, monkeypatch):
+        class _ExhaustedPool:
+            def getconn(self):
+                raise PoolError('connection pool exhausted')
+
+            def putconn(self, connection):
+                raise AssertionError('No connection to return')
+        slots = BoundedSemaphore(2)
+        monkeypatch.setattr(data_loch, 'connection_pool', _ExhaustedPool())
+        monkeypatch.setattr(data_loch, 'connection_slots', slots)
+        with pytest.raises(PoolError, match='exhausted'):
+            with data_loch.cursor_from_pool(query_name='test'):
+                pass
+        # The slot is given back.
+        assert slots.acquire(blocking=False) and slots.acquire(blocking=False)
+
+    def test_wait_for_connection_slot_times_out(self, app, monkeypatch):
+        monkeypatch.setattr(data_loch, 'connection_pool', object())
+        monkeypatch.setattr(data_loch, 'connection_slots', BoundedSemaphore(1))
+        data_loch.connection_slots.acquire()
+        with override_config(app, 'DATA_LOCH_POOL_WAIT_SECONDS', 0.1):
+            with pytest.raises(PoolError, match='Timed out'):
+                with data_loch.cursor_from_pool(query_name='test'):
+                    pass
+        assert data_loch.get_query_stats()['test']['errors'] >= 1
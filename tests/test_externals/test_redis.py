@@ -0,0 +1,295 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+import json
+from threading import Thread, Timer
+import time
+import zlib
+
+from ripley.externals import redis as redis_cache
+from tests.util import enable_redis_cache, override_config
+
+
+def _wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out'
+        time.sleep(0.05)
+
+
+class TestLocalCache:
+
+    def test_first_set_is_held_locally(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            redis_cache.cache_dict_object('canvas_external_tools', {'tools': [1]}, 60)
+            # Dropping the key behind the cache's back shows that the object is served from process memory.
+            redis_conn.delete('canvas_external_tools')
+            assert redis_cache.fetch_cached_dict_object('canvas_external_tools') == {'tools': [1]}
+
+    def test_local_copy_bounded_by_max_seconds(self, app):
+        with enable_redis_cache(app), override_config(app, 'REDIS_LOCAL_CACHE_MAX_SECONDS', 5):
+            redis_cache.cache_dict_object('canvas_external_tools', {'tools': [1]}, 3600)
+            expires_at, _ = redis_cache.local_cache['canvas_external_tools']
+            assert expires_at <= time.monotonic() + 5
+
+    def test_invalidation_from_other_node(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            redis_cache.cache_dict_object('canvas_external_tools', {'tools': [1]}, 60)
+            redis_conn.set('canvas_external_tools', json.dumps({'tools': [2]}))
+            redis_conn.publish(redis_cache.INVALIDATION_CHANNEL, 'another-node key:canvas_external_tools')
+            _wait_for(lambda: 'canvas_external_tools' not in redis_cache.local_cache)
+            assert redis_cache.fetch_cached_dict_object('canvas_external_tools') == {'tools': [2]}
+
+    def test_own_invalidations_ignored(self, app):
+        with enable_redis_cache(app):
+            redis_cache.cache_dict_object('canvas_external_tools', {'tools': [1]}, 60)
+            redis_cache._on_invalidation_message({'data': f'{redis_cache.local_cache_node_id} flush'.encode('utf-8')})
+            assert 'canvas_external_tools' in redis_cache.local_cache
+
+    def test_delete_invalidates_local_copy(self, app):
+        with enable_redis_cache(app):
+            redis_cache.cache_dict_object('user_profile:10000:1', {'uid': '10000'}, 60)
+            redis_cache.cache_dict_object('user_profile:10000:2', {'uid': '10000'}, 60)
+            assert redis_cache.delete_cache_prefix('user_profile:10000') == 2
+            assert redis_cache.fetch_cached_dict_object('user_profile:10000:1') is None
+            assert not redis_cache.local_cache
+
+    def test_least_recently_used_evicted(self, app):
+        with enable_redis_cache(app), override_config(app, 'REDIS_LOCAL_CACHE_MAX_KEYS', 2):
+            redis_cache.cache_dict_object('user_profile:1:1', {'uid': '1'}, 60)
+            redis_cache.cache_dict_object('user_profile:2:1', {'uid': '2'}, 60)
+            redis_cache.fetch_cached_dict_object('user_profile:1:1')
+            redis_cache.cache_dict_object('user_profile:3:1', {'uid': '3'}, 60)
+            assert list(redis_cache.local_cache) == ['user_profile:1:1', 'user_profile:3:1']
+            assert redis_cache.get_cache_stats()['user_profile']['evictions'] == 1
+
+    def test_callers_cannot_alter_local_copy(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            tools = {'tools': [1]}
+            redis_cache.cache_dict_object('canvas_external_tools', tools, 60)
+            redis_conn.delete('canvas_external_tools')
+            tools['tools'].append(2)
+            redis_cache.fetch_cached_dict_object('canvas_external_tools')['tools'].append(3)
+            assert redis_cache.fetch_cached_dict_object('canvas_external_tools') == {'tools': [1]}
+
+    def test_stats_flushed_outside_local_cache_lock(self, app, monkeypatch):
+        lock_held_during_flush = []
+
+        def _try_local_cache_lock(acquired):
+            if redis_cache.local_cache_lock.acquire(timeout=1):
+                acquired.append(True)
+                redis_cache.local_cache_lock.release()
+
+        def _flush_cache_stats():
+            # Another thread must be able to take the lock while stats are flushed.
+            acquired = []
+            thread = Thread(target=_try_local_cache_lock, args=(acquired,))
+            thread.start()
+            thread.join()
+            lock_held_during_flush.append(not acquired)
+        with enable_redis_cache(app), override_config(app, 'REDIS_LOCAL_CACHE_MAX_KEYS', 1):
+            monkeypatch.setattr(redis_cache, '_flush_cache_stats', _flush_cache_stats)
+            monkeypatch.setattr(redis_cache, 'CACHE_STATS_FLUSH_SECONDS', -1)
+            redis_cache.cache_dict_object('user_profile:1:1', {'uid': '1'}, 60)
+            lock_held_during_flush.clear()
+            redis_cache.cache_dict_object('user_profile:2:1', {'uid': '2'}, 60)
+            assert lock_held_during_flush and not any(lock_held_during_flush)
+
+
+class TestCodecs:
+
+    def test_large_objects_compressed(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            dict_object = {'rows': ['x' * 100] * 100}
+            redis_cache.cache_dict_object('grade_distribution/1', dict_object, 60)
+            cached_value = redis_conn.get('grade_distribution/1')
+            assert cached_value[0:1] == redis_cache.CODEC_ZLIB_JSON
+            assert len(cached_value) < len(json.dumps(dict_object))
+            redis_cache.local_cache.clear()
+            assert redis_cache.fetch_cached_dict_object('grade_distribution/1') == dict_object
+
+    def test_small_and_legacy_objects(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            redis_cache.cache_dict_object('grade_distribution/1', {'a': 1}, 60)
+            assert redis_conn.get('grade_distribution/1')[0:1] == redis_cache.CODEC_JSON
+            redis_conn.set('grade_distribution/2', json.dumps({'b': 2}))
+            redis_conn.set('grade_distribution/3', redis_cache.CODEC_ZLIB_JSON + zlib.compress(b'{"c": 3}'))
+            redis_cache.local_cache.clear()
+            assert redis_cache.fetch_cached_dict_object('grade_distribution/1') == {'a': 1}
+            assert redis_cache.fetch_cached_dict_object('grade_distribution/2') == {'b': 2}
+            assert redis_cache.fetch_cached_dict_object('grade_distribution/3') == {'c': 3}
+
+
+class TestFetchOrFill:
+
+    def test_fill_once(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            fills = []
+
+            def _fill():
+                fills.append(1)
+                return {'tools': len(fills)}
+            assert redis_cache.fetch_or_fill_cached_dict_object('canvas_external_tools', _fill, 60) == {'tools': 1}
+            redis_cache.local_cache.clear()
+            assert redis_cache.fetch_or_fill_cached_dict_object('canvas_external_tools', _fill, 60) == {'tools': 1}
+            assert len(fills) == 1
+            assert redis_conn.get('fill_lock:canvas_external_tools') is None
+
+    def test_local_copy_not_served_past_fresh_window(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            redis_cache.fetch_or_fill_cached_dict_object('user_profile:1:1', lambda: {'uid': '1'}, 10, stale_seconds=3600)
+            expires_at, _ = redis_cache.local_cache['user_profile:1:1']
+            assert expires_at <= time.monotonic() + 10
+            assert 3600 < redis_conn.ttl('user_profile:1:1') <= 3610
+
+    def test_stale_object_served_while_another_caller_fills(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            redis_cache.fetch_or_fill_cached_dict_object('user_profile:1:1', lambda: {'name': 'old'}, 10, stale_seconds=60)
+            redis_cache.local_cache.clear()
+            # Move the entry into its stale window, and have someone else hold the fill lock.
+            redis_conn.expire('user_profile:1:1', 30)
+            redis_conn.set('fill_lock:user_profile:1:1', 'another-caller')
+            cached = redis_cache.fetch_or_fill_cached_dict_object('user_profile:1:1', lambda: {'name': 'new'}, 10, stale_seconds=60)
+            assert cached == {'name': 'old'}
+
+    def test_stale_object_refreshed_in_background(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            redis_cache.fetch_or_fill_cached_dict_object('user_profile:1:1', lambda: {'name': 'old'}, 10, stale_seconds=60)
+            redis_cache.local_cache.clear()
+            redis_conn.expire('user_profile:1:1', 30)
+            cached = redis_cache.fetch_or_fill_cached_dict_object(
+                'user_profile:1:1',
+                lambda: {'name': 'new'},
+                10,
+                stale_seconds=60,
+                background_refresh=True,
+            )
+            assert cached == {'name': 'old'}
+            _wait_for(lambda: redis_conn.get('fill_lock:user_profile:1:1') is None)
+            assert redis_cache.fetch_cached_dict_object('user_profile:1:1') == {'name': 'new'}
+            assert redis_conn.ttl('user_profile:1:1') > 60
+
+    def test_fill_lock_wait_times_out(self, app):
+        with enable_redis_cache(app) as redis_conn, override_config(app, 'REDIS_CACHE_FILL_WAIT_SECONDS', 0.3):
+            redis_conn.set('fill_lock:canvas_external_tools', 'another-caller')
+            started_at = time.monotonic()
+            cached = redis_cache.fetch_or_fill_cached_dict_object('canvas_external_tools', lambda: {'tools': []}, 60)
+            assert cached == {'tools': []}
+            assert time.monotonic() - started_at >= 0.3
+            # The caller who timed out does not overwrite the lock holder's eventual result.
+            assert redis_conn.get('canvas_external_tools') is None
+
+    def test_waiting_caller_gets_filled_object(self, app):
+        with enable_redis_cache(app) as redis_conn, override_config(app, 'REDIS_CACHE_FILL_WAIT_SECONDS', 3):
+            redis_conn.set('fill_lock:canvas_external_tools', 'another-caller')
+            Timer(0.3, lambda: redis_conn.set('canvas_external_tools', json.dumps({'tools': ['filled elsewhere']}), ex=60)).start()
+            cached = redis_cache.fetch_or_fill_cached_dict_object('canvas_external_tools', lambda: {'tools': []}, 60)
+            assert cached == {'tools': ['filled elsewhere']}
+
+
+class TestCacheNamespaces:
+
+    def test_delete_cache_namespace(self, app, monkeypatch):
+        monkeypatch.setattr(redis_cache, 'SCAN_BATCH_SIZE', 2)
+        with enable_redis_cache(app) as redis_conn:
+            for i in range(5):
+                redis_cache.cache_dict_object(f'grade_distribution/{i}', {'i': i}, 60)
+            redis_cache.cache_dict_object('canvas_external_tools', {'tools': []}, 60)
+            assert redis_cache.delete_cache_namespace('grade_distribution') == 5
+            assert redis_conn.keys('grade_distribution/*') == []
+            assert redis_cache.fetch_cached_dict_object('grade_distribution/1') is None
+            assert redis_cache.fetch_cached_dict_object('canvas_external_tools') == {'tools': []}
+
+    def test_namespace_stats(self, app):
+        with enable_redis_cache(app):
+            redis_cache.cache_dict_object('grade_distribution/1', {'a': 1}, 60)
+            stats = {s['name']: s for s in redis_cache.get_cache_namespace_stats()}
+            assert stats['grade_distribution']['keyCount'] == 1
+            assert stats['user_profile']['keyCount'] == 0
+
+
+class TestFlags:
+
+    def test_flag_cleared_only_by_latest_token(self, app):
+        with enable_redis_cache(app):
+            assert redis_cache.get_flag('dated_csv_manifest_stale:m') is None
+            first_token = redis_cache.set_flag('dated_csv_manifest_stale:m', 60)
+            second_token = redis_cache.set_flag('dated_csv_manifest_stale:m', 60)
+            redis_cache.clear_flag('dated_csv_manifest_stale:m', first_token)
+            assert redis_cache.get_flag('dated_csv_manifest_stale:m') == second_token
+            redis_cache.clear_flag('dated_csv_manifest_stale:m', second_token)
+            assert redis_cache.get_flag('dated_csv_manifest_stale:m') is None
+
+
+class TestIndexedKeys:
+
+    def test_delete_indexed_cache_keys(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            for cache_key in ('indexed:1', 'indexed:2', 'unindexed:1'):
+                redis_cache.cache_dict_object(cache_key, {'key': cache_key})
+            redis_cache.index_cache_key('index:test', 'indexed:1', 60)
+            redis_cache.index_cache_key('index:test', 'indexed:2', 60)
+            assert redis_cache.delete_indexed_cache_keys('index:test') == 2
+            assert redis_cache.fetch_cached_dict_object('indexed:1') is None
+            assert redis_cache.fetch_cached_dict_object('indexed:2') is None
+            assert redis_cache.fetch_cached_dict_object('unindexed:1') == {'key': 'unindexed:1'}
+            assert not redis_conn.exists('index:test')
+            assert redis_cache.delete_indexed_cache_keys('index:test') == 0
+
+
+class TestLocks:
+
+    def test_lock_held_until_released(self, app):
+        with enable_redis_cache(app):
+            lock_token = redis_cache.acquire_lock('dated_csv_manifest_lock:m', 60)
+            assert lock_token
+            started_at = time.monotonic()
+            assert redis_cache.acquire_lock('dated_csv_manifest_lock:m', 60, wait_seconds=0.2) is None
+            assert time.monotonic() - started_at >= 0.2
+            redis_cache.release_lock('dated_csv_manifest_lock:m', lock_token)
+            assert redis_cache.acquire_lock('dated_csv_manifest_lock:m', 60)
+
+    def test_release_leaves_other_holder(self, app):
+        with enable_redis_cache(app) as redis_conn:
+            redis_conn.set('dated_csv_manifest_lock:m', 'another-caller')
+            redis_cache.release_lock('dated_csv_manifest_lock:m', 'expired-token')
+            assert redis_conn.get('dated_csv_manifest_lock:m') == b'another-caller'
+
+
+class TestCacheStats:
+
+    def test_hits_misses_and_fills(self, app):
+        with enable_redis_cache(app):
+            redis_cache.fetch_or_fill_cached_dict_object('grade_distribution/1', lambda: {'a': 1}, 60)
+            redis_cache.fetch_cached_dict_object('grade_distribution/1')
+            redis_cache.local_cache.clear()
+            redis_cache.fetch_cached_dict_object('grade_distribution/1')
+            stats = redis_cache.get_cache_stats()['grade_distribution']
+            assert stats['misses'] == 1
+            assert stats['fills'] == 1
+            assert stats['writes'] == 1
+            assert stats['hits'] == 2
+            assert stats['localHits'] == 1
+            assert stats['hitRate'] == 2 / 3
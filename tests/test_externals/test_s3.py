@@ -0,0 +1,165 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import tempfile
+import time
+from unittest import mock
+
+from ripley.externals import s3
+from ripley.lib.util import utc_now
+from tests.util import enable_redis_cache, mock_s3_bucket
+
+
+class TestS3:
+
+    def test_sts_credentials_reused(self, app):
+        with mock_s3_bucket(app):
+            s3.aws_session_cache['session'] = None
+            with mock.patch('ripley.externals.s3._get_sts_credentials', wraps=s3._get_sts_credentials) as sts:
+                client = s3._get_s3_client()
+                assert s3.get_keys_with_prefix('canvas-sis-imports') == []
+                assert s3.get_signed_urls(app.config['AWS_S3_BUCKET'], ['some-key'], 60)
+                assert s3._get_s3_client() is client
+                assert sts.call_count == 1
+
+    def test_sts_credentials_refreshed_before_expiry(self, app):
+        with mock_s3_bucket(app):
+            s3.aws_session_cache['session'] = None
+            with mock.patch('ripley.externals.s3._get_sts_credentials', wraps=s3._get_sts_credentials) as sts:
+                client = s3._get_s3_client()
+                s3.aws_session_cache['expires_at'] = utc_now() + timedelta(seconds=s3.STS_REFRESH_MARGIN_SECONDS - 1)
+                assert s3._get_s3_client() is not client
+                assert sts.call_count == 2
+
+    def test_sts_credentials_outlive_signed_urls(self, app):
+        with mock_s3_bucket(app):
+            s3.aws_session_cache['session'] = None
+            with mock.patch('ripley.externals.s3._get_sts_credentials', wraps=s3._get_sts_credentials) as sts:
+                s3._get_s3_client()
+                # Credentials with ten minutes left cannot sign a fifteen-minute URL.
+                s3.aws_session_cache['expires_at'] = utc_now() + timedelta(seconds=600)
+                assert s3.get_signed_urls(app.config['AWS_S3_BUCKET'], ['some-key'], 900)
+                assert sts.call_count == 2
+                assert s3.aws_session_cache['expires_at'] >= utc_now() + timedelta(seconds=900 + s3.STS_REFRESH_MARGIN_SECONDS)
+                # The longer-lived credentials are then reused for further URLs.
+                assert s3.get_signed_urls(app.config['AWS_S3_BUCKET'], ['some-key'], 900)
+                assert sts.call_count == 2
+
+    def test_dated_csv_manifest(self, app):
+        with mock_s3_bucket(app) as s3_resource:
+            timestamp = utc_now().strftime('%F_%H-%M-%S')
+            earlier_timestamp = (utc_now() - timedelta(seconds=1)).strftime('%F_%H-%M-%S')
+            _upload_csv('enrollments-TERM-2023-B', timestamp)
+            _upload_csv('enrollments-TERM-2023-B', earlier_timestamp)
+            _upload_csv('user-provision-add-new', timestamp)
+
+            manifest = s3._get_dated_csv_manifest('canvas-sis-imports', timestamp[0:7])
+            assert len(manifest) == 3
+            assert manifest[0]['type'] == 'enrollments'
+            assert manifest[0]['term'] == 'TERM:2023-B'
+            assert manifest[2]['type'] == 'user-provision-add-new'
+            assert manifest[2]['term'] == ''
+
+            with mock.patch('ripley.externals.s3.get_keys_with_prefix') as list_keys:
+                last_key = s3.find_last_dated_csv('canvas-sis-imports', 'enrollments-TERM-2023-B')
+                assert last_key.endswith(f'enrollments-TERM-2023-B-{timestamp}.csv')
+                assert s3.find_all_dated_csvs('canvas-sis-imports', 'enrollments', since=timestamp) == [last_key]
+                assert list_keys.call_count == 0
+
+            # A missing manifest falls back to listing the folder, and is rebuilt on the next upload.
+            s3_resource.Object(app.config['AWS_S3_BUCKET'], s3._dated_csv_manifest_key('canvas-sis-imports', timestamp[0:7])).delete()
+            assert len(s3.find_all_dated_csvs('canvas-sis-imports', 'enrollments')) == 2
+            _upload_csv('sis-ids', timestamp)
+            assert len(s3._get_dated_csv_manifest('canvas-sis-imports', timestamp[0:7])) == 4
+
+    def test_concurrent_dated_csv_manifest_writers(self, app):
+        timestamp = utc_now().strftime('%F_%H-%M-%S')
+        get_dated_csv_manifest = s3._get_dated_csv_manifest
+
+        def _slow_get_dated_csv_manifest(folder, month):
+            # Widen the window between reading the manifest and rewriting it.
+            manifest = get_dated_csv_manifest(folder, month)
+            time.sleep(0.05)
+            return manifest
+
+        def _upload(i):
+            with app.app_context():
+                _upload_csv(f'enrollments-{i}', timestamp)
+        with enable_redis_cache(app), mock_s3_bucket(app):
+            _upload(0)
+            with mock.patch('ripley.externals.s3._get_dated_csv_manifest', _slow_get_dated_csv_manifest):
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    list(executor.map(_upload, range(1, 9)))
+            manifest = s3._get_dated_csv_manifest('canvas-sis-imports', timestamp[0:7])
+            assert sorted(e['type'] for e in manifest) == [f'enrollments-{i}' for i in range(9)]
+
+    def test_dated_csv_manifest_lock_timeout(self, app):
+        timestamp = utc_now().strftime('%F_%H-%M-%S')
+        manifest_key = s3._dated_csv_manifest_key('canvas-sis-imports', timestamp[0:7])
+        with enable_redis_cache(app) as redis_conn, mock_s3_bucket(app):
+            _upload_csv('enrollments-TERM-2023-B', timestamp)
+            redis_conn.set(f'dated_csv_manifest_lock:{manifest_key}', 'another-writer')
+            with mock.patch('ripley.externals.s3.DATED_CSV_MANIFEST_LOCK_WAIT_SECONDS', 0.2):
+                _upload_csv('sis-ids', timestamp)
+            # The manifest is left to the lock holder, but flagged stale, so lookups list the folder instead.
+            assert len(s3._get_dated_csv_manifest('canvas-sis-imports', timestamp[0:7])) == 1
+            assert redis_conn.exists(f'dated_csv_manifest_stale:{manifest_key}')
+            with mock.patch('ripley.externals.s3.get_keys_with_prefix', wraps=s3.get_keys_with_prefix) as list_keys:
+                assert len(s3.find_all_dated_csvs('canvas-sis-imports', '', since=timestamp)) == 2
+                assert list_keys.call_count == 1
+            # The next writer to get the lock rebuilds the manifest from the listing and lowers the flag.
+            redis_conn.delete(f'dated_csv_manifest_lock:{manifest_key}')
+            _upload_csv('user-provision-add-new', timestamp)
+            assert len(s3._get_dated_csv_manifest('canvas-sis-imports', timestamp[0:7])) == 3
+            assert not redis_conn.exists(f'dated_csv_manifest_stale:{manifest_key}')
+
+    def test_dated_csv_manifest_lock_timeout_during_rebuild(self, app):
+        timestamp = utc_now().strftime('%F_%H-%M-%S')
+        manifest_key = s3._dated_csv_manifest_key('canvas-sis-imports', timestamp[0:7])
+        list_dated_csv_manifest = s3._list_dated_csv_manifest
+
+        def _list_then_time_out_writer(folder, month_path):
+            # Another writer times out while the lock holder is rebuilding the stale manifest.
+            entries = list_dated_csv_manifest(folder, month_path)
+            with mock.patch('ripley.externals.s3.DATED_CSV_MANIFEST_LOCK_WAIT_SECONDS', 0):
+                _upload_csv('sis-ids', timestamp)
+            return entries
+        with enable_redis_cache(app) as redis_conn, mock_s3_bucket(app):
+            _upload_csv('enrollments-TERM-2023-B', timestamp)
+            s3.set_flag(f'dated_csv_manifest_stale:{manifest_key}', 60)
+            with mock.patch('ripley.externals.s3._list_dated_csv_manifest', _list_then_time_out_writer):
+                _upload_csv('user-provision-add-new', timestamp)
+            assert len(s3._get_dated_csv_manifest('canvas-sis-imports', timestamp[0:7])) == 2
+            assert redis_conn.exists(f'dated_csv_manifest_stale:{manifest_key}')
+            assert len(s3.find_all_dated_csvs('canvas-sis-imports', '', since=timestamp)) == 3
+
+
+def _upload_csv(remote_name, timestamp):
+    with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+        f.write(b'id\n1\n')
+        f.flush()
+        assert s3.upload_dated_csv('canvas-sis-imports', f.name, remote_name, timestamp)
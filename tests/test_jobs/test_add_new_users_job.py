@@ -23,10 +23,14 @@ SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
 ENHANCEMENTS, OR MODIFICATIONS.
 """
 
+import tempfile
+
 from moto import mock_s3
 import requests_mock
+from ripley.externals.s3 import upload_dated_csv
 from ripley.jobs.add_new_users_job import AddNewUsersJob
-from tests.util import mock_s3_bucket, read_s3_csv, register_canvas_uris
+from ripley.lib.util import utc_now
+from tests.util import mock_s3_bucket, override_config, read_s3_csv, register_canvas_uris
 
 
 class TestAddNewUsersJob:
@@ -60,3 +64,29 @@ class TestAddNewUsersJob:
                 assert users_imported[0] == 'user_id,login_id,first_name,last_name,email,status'
                 assert users_imported[1] == 'UID:10000,10000,Ellen,Ripley,ellen.ripley@berkeley.edu,active'
                 assert users_imported[2] == 'UID:10001,10001,Dallas,👨‍✈️,dallas@berkeley.edu,active'
+
+    @mock_s3
+    def test_reuses_recent_provisioning_report(self, app):
+        with requests_mock.Mocker() as m:
+            register_canvas_uris(app, {
+                'account': ['create_sis_import'],
+                'sis_import': ['get_by_id'],
+            }, m)
+
+            with mock_s3_bucket(app) as s3, override_config(app, 'CANVAS_PROVISIONING_REPORT_MAX_AGE_SECONDS', 3600):
+                archived_report = tempfile.NamedTemporaryFile(suffix='.csv')
+                with open(archived_report.name, 'w') as f:
+                    f.write('canvas_user_id,user_id,login_id,first_name,last_name,full_name,email,status\n')
+                    f.write('3456789,UID:10000,10000,Ellen,Ripley,Ellen Ripley,ellen.ripley@berkeley.edu,active\n')
+                upload_dated_csv(
+                    folder='canvas-provisioning-reports',
+                    local_name=archived_report.name,
+                    remote_name='provisioned-users-refresh-full',
+                    timestamp=utc_now().strftime('%F_%H-%M-%S'),
+                )
+                AddNewUsersJob(app)._run()
+                assert not any('reports/provisioning_csv' in r.url for r in m.request_history)
+
+                users_imported = read_s3_csv(app, s3, 'user-provision-add-new')
+                assert len(users_imported) == 5
+                assert 'UID:10000,10000,Ellen,Ripley,ellen.ripley@berkeley.edu,active' not in users_imported
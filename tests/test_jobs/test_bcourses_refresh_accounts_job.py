@@ -38,7 +38,7 @@ class TestBcoursesRefreshAccountsJob:
             assert_s3_key_not_found(app, s3, 'sis-ids')
             assert_s3_key_not_found(app, s3, 'user-provision')
 
-    @mock.patch('ripley.lib.calnet_utils.get_users')
+    @mock.patch('ripley.lib.calnet_utils.stream_users')
     def test_name_change(self, mock_users, app, campus_users):
         with setup_bcourses_refresh_job(app) as (s3, m):
             for u in campus_users:
@@ -56,7 +56,7 @@ class TestBcoursesRefreshAccountsJob:
             assert users_imported[0] == 'user_id,login_id,first_name,last_name,email,status'
             assert users_imported[1] == '30030000,30000,Definitely-not-a-synthetic-Ash,🤖,synthetic.ash@berkeley.edu,active'
 
-    @mock.patch('ripley.lib.calnet_utils.get_users')
+    @mock.patch('ripley.lib.calnet_utils.stream_users')
     def test_email_change(self, mock_users, app, campus_users):
         with setup_bcourses_refresh_job(app) as (s3, m):
             for u in campus_users:
@@ -74,7 +74,7 @@ class TestBcoursesRefreshAccountsJob:
             assert users_imported[0] == 'user_id,login_id,first_name,last_name,email,status'
             assert users_imported[1] == '30030000,30000,Ash,🤖,definitely.no.robots.here@berkeley.edu,active'
 
-    @mock.patch('ripley.lib.calnet_utils.get_users')
+    @mock.patch('ripley.lib.calnet_utils.stream_users')
     def test_sis_id_change(self, mock_users, app, campus_users):
         with setup_bcourses_refresh_job(app) as (s3, m):
             for u in campus_users:
@@ -25,8 +25,11 @@ ENHANCEMENTS, OR MODIFICATIONS.
 import csv
 
 from moto import mock_s3
+import pytest
 import requests_mock
+from ripley.externals import canvas
 from ripley.externals.s3 import find_last_dated_csvs, stream_object_text
+from ripley.jobs.errors import BackgroundJobError
 from ripley.jobs.export_term_enrollments_job import ExportTermEnrollmentsJob
 from tests.util import mock_s3_bucket, register_canvas_uris
 
@@ -34,7 +37,54 @@ from tests.util import mock_s3_bucket, register_canvas_uris
 class TestExportTermEnrollmentsJob:
 
     @mock_s3
-    def test_job_run(self, app):
+    def test_provisioning_report_mode(self, app):
+        with requests_mock.Mocker() as m:
+            register_canvas_uris(app, {
+                'account': [
+                    'create_report_provisioning_csv_enrollments',
+                    'create_report_provisioning_csv_sections',
+                    'create_report_provisioning_csv_users',
+                    'get_by_id',
+                    'get_report_provisioning_csv_enrollments',
+                    'get_report_provisioning_csv_sections',
+                    'get_report_provisioning_csv_users',
+                ],
+                'file': [
+                    'download_provisioning_csv_enrollments',
+                    'download_provisioning_csv_sections',
+                    'download_provisioning_csv_users',
+                    'get_provisioning_csv_enrollments',
+                    'get_provisioning_csv_sections',
+                    'get_provisioning_csv_users',
+                ],
+            }, m)
+
+            with mock_s3_bucket(app):
+                ExportTermEnrollmentsJob(app)._run(params={'sis_term_ids': ['TERM:2023-B']})
+
+                csvs = find_last_dated_csvs('canvas-provisioning-reports', ['enrollments-TERM-2023-B'])
+                provisioning_report = csvs['enrollments-TERM-2023-B']
+                rows = [r for r in csv.DictReader(stream_object_text(provisioning_report))]
+
+                assert len(rows) == 3
+                assert rows[0] == {
+                    'course_id': '8876542',
+                    'canvas_section_id': '10000',
+                    'sis_section_id': 'SEC:2023-B-32936',
+                    'canvas_user_id': '5678901',
+                    'sis_login_id': '40000',
+                    'sis_user_id': '30040000',
+                    'role': 'Lead TA',
+                    'sis_import_id': 'provisioning_report',
+                    'enrollment_state': 'active',
+                }
+                assert rows[1]['role'] == 'StudentEnrollment'
+                assert rows[1]['sis_login_id'] == '20000'
+                assert rows[2]['role'] == 'TeacherEnrollment'
+                assert rows[2]['sis_import_id'] == ''
+
+    @mock_s3
+    def test_api_mode(self, app):
         with requests_mock.Mocker() as m:
             register_canvas_uris(app, {
                 'account': [
@@ -52,7 +102,7 @@ class TestExportTermEnrollmentsJob:
             }, m)
 
             with mock_s3_bucket(app):
-                ExportTermEnrollmentsJob(app)._run(params={'sis_term_id': 'TERM:2023-B'})
+                ExportTermEnrollmentsJob(app)._run(params={'mode': 'api', 'sis_term_id': 'TERM:2023-B'})
 
                 csvs = find_last_dated_csvs('canvas-provisioning-reports', ['enrollments-TERM-2023-B'])
                 provisioning_report = csvs['enrollments-TERM-2023-B']
@@ -70,3 +120,24 @@ class TestExportTermEnrollmentsJob:
                     'sis_import_id': '10000000',
                     'enrollment_state': 'active',
                 }
+
+    def test_reports_requested_together(self, app, monkeypatch):
+        requested = []
+
+        def _get_csv_reports(report_specs, compress=False):
+            requested.append(sorted(report_specs))
+            return iter([])
+        monkeypatch.setattr(canvas, 'get_csv_reports', _get_csv_reports)
+        with pytest.raises(BackgroundJobError, match='users report unavailable'):
+            ExportTermEnrollmentsJob(app)._run(params={'sis_term_ids': ['TERM:2023-B', 'TERM:2023-C']})
+        assert requested == [[
+            'enrollments:TERM:2023-B',
+            'enrollments:TERM:2023-C',
+            'sections:TERM:2023-B',
+            'sections:TERM:2023-C',
+            'users',
+        ]]
+
+    def test_unknown_mode(self, app):
+        with pytest.raises(BackgroundJobError, match='Unknown term enrollments export mode'):
+            ExportTermEnrollmentsJob(app)._run(params={'mode': 'provisioning_reports', 'sis_term_ids': ['TERM:2023-B']})
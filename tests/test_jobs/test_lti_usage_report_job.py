@@ -24,7 +24,10 @@ ENHANCEMENTS, OR MODIFICATIONS.
 """
 
 from moto import mock_s3
+import pytest
 import requests_mock
+from ripley.externals import canvas
+from ripley.jobs.errors import BackgroundJobError
 from ripley.jobs.lti_usage_report_job import LtiUsageReportJob
 from tests.util import mock_s3_bucket, read_s3_csv, register_canvas_uris
 
@@ -90,3 +93,14 @@ class TestLtiUsageReportJob:
                 assert courses_report[2] == 'https://hard_knocks_api.instructure.com/courses/1234567,COM LIT ABC,Chat,,'
                 assert courses_report[3] == 'https://hard_knocks_api.instructure.com/courses/1234567,COM LIT ABC,Roster Photos,,'
                 assert courses_report[4] == 'https://hard_knocks_api.instructure.com/courses/1234567,COM LIT ABC,Attendance,,'
+
+    @pytest.mark.parametrize('failed_report', ['accounts', 'courses'])
+    def test_report_retrieval_failure(self, app, monkeypatch, failed_report):
+        def _get_csv_reports(report_specs):
+            for key in report_specs:
+                yield key, None if key == failed_report else iter([])
+        monkeypatch.setattr(canvas, 'get_csv_reports', _get_csv_reports)
+        with mock_s3_bucket(app) as s3:
+            with pytest.raises(BackgroundJobError, match=f'Failed to retrieve CSV {failed_report} report'):
+                LtiUsageReportJob(app)._run()
+            assert list(s3.Bucket(app.config['AWS_S3_BUCKET']).objects.all()) == []
@@ -26,6 +26,7 @@ ENHANCEMENTS, OR MODIFICATIONS.
 from datetime import date
 from unittest import mock
 
+from ripley.externals.data_loch import get_current_term
 from ripley.lib.berkeley_term import BerkeleyTerm
 from tests.util import override_config
 
@@ -67,3 +68,15 @@ class TestBerkeleyTerm:
             assert current_terms['current'].to_english() == 'Spring 2024'
             assert current_terms['next'].to_english() == 'Summer 2024'
             assert 'future' not in current_terms
+
+    @mock.patch('ripley.lib.util.local_today')
+    def test_current_terms_resolved_once_per_day(self, mock_local_today, app):
+        with override_config(app, 'CANVAS_CURRENT_ENROLLMENT_TERM', 'auto'), override_config(app, 'CANVAS_FUTURE_ENROLLMENT_TERM', 'auto'):
+            with mock.patch('ripley.lib.berkeley_term.get_current_term', wraps=get_current_term) as mock_get_current_term:
+                mock_local_today.return_value = date(2023, 3, 16)
+                assert BerkeleyTerm.get_current_terms()['current'].to_english() == 'Spring 2023'
+                assert BerkeleyTerm.get_current_terms()['future'].to_english() == 'Fall 2023'
+                assert mock_get_current_term.call_count == 1
+                mock_local_today.return_value = date(2023, 6, 16)
+                assert BerkeleyTerm.get_current_terms()['current'].to_english() == 'Summer 2023'
+                assert mock_get_current_term.call_count == 2
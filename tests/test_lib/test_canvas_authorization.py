@@ -0,0 +1,54 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from types import SimpleNamespace
+
+from ripley.externals import canvas
+from ripley.externals.redis import fetch_cached_dict_object
+from ripley.lib.canvas_authorization import can_administrate_canvas
+from tests.util import enable_redis_cache
+
+
+class TestCanAdministrateCanvas:
+
+    def test_admin_roster_cached(self, app, monkeypatch):
+        calls = []
+
+        def _get_admins():
+            calls.append(1)
+            return [SimpleNamespace(user={'login_id': '20000'}), SimpleNamespace(user={'login_id': '20001'})]
+        monkeypatch.setattr(canvas, 'get_admins', _get_admins)
+        with enable_redis_cache(app):
+            assert can_administrate_canvas('20000') is True
+            assert can_administrate_canvas('20001') is True
+            assert can_administrate_canvas('10001') is False
+            assert len(calls) == 1
+            assert fetch_cached_dict_object('canvas_admin_uids') == {'uids': ['20000', '20001']}
+
+    def test_roster_unavailable(self, app, monkeypatch):
+        monkeypatch.setattr(canvas, 'get_admins', lambda: None)
+        with enable_redis_cache(app):
+            assert can_administrate_canvas('20000') is False
+            assert fetch_cached_dict_object('canvas_admin_uids') is None
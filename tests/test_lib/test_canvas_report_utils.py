@@ -0,0 +1,92 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from datetime import timedelta
+import tempfile
+
+from ripley.externals import canvas
+from ripley.externals.s3 import upload_dated_csv
+from ripley.lib.canvas_report_utils import ARCHIVE_FOLDER, get_provisioning_reports, SIS_IMPORTS_FOLDER
+from ripley.lib.util import utc_now
+from tests.util import mock_s3_bucket, override_config
+
+
+class TestGetProvisioningReports:
+
+    def test_recent_report_reused(self, app, monkeypatch):
+        requested = _mock_get_csv_reports(monkeypatch)
+        with mock_s3_bucket(app), override_config(app, 'CANVAS_PROVISIONING_REPORT_MAX_AGE_SECONDS', 3600):
+            _upload(SIS_IMPORTS_FOLDER, 'user-provision', _timestamp(minutes_ago=20))
+            _upload(ARCHIVE_FOLDER, 'provisioned-users-full', _timestamp(minutes_ago=10), b'login_id\narchived\n')
+            with tempfile.NamedTemporaryFile() as report_file:
+                report_specs = {'users': {'report_type': 'users', 'download_path': report_file.name}}
+                assert list(get_provisioning_reports(report_specs, _timestamp(), 'full')) == [('users', True)]
+                assert requested == [[]]
+                with open(report_file.name, 'rb') as f:
+                    assert f.read() == b'login_id\narchived\n'
+
+    def test_report_older_than_sis_import_regenerated(self, app, monkeypatch):
+        requested = _mock_get_csv_reports(monkeypatch)
+        with mock_s3_bucket(app), override_config(app, 'CANVAS_PROVISIONING_REPORT_MAX_AGE_SECONDS', 3600):
+            _upload(ARCHIVE_FOLDER, 'provisioned-users-full', _timestamp(minutes_ago=20))
+            _upload(SIS_IMPORTS_FOLDER, 'sis-ids', _timestamp(minutes_ago=10))
+            with tempfile.NamedTemporaryFile() as report_file:
+                report_specs = {'users': {'report_type': 'users', 'download_path': report_file.name}}
+                assert list(get_provisioning_reports(report_specs, _timestamp(), 'full')) == [('users', True)]
+                assert requested == [['users']]
+
+    def test_report_from_importing_job_regenerated(self, app, monkeypatch):
+        # A job archives its report and posts its SIS imports under one timestamp, the imports landing after the report.
+        requested = _mock_get_csv_reports(monkeypatch)
+        job_timestamp = _timestamp(minutes_ago=10)
+        with mock_s3_bucket(app), override_config(app, 'CANVAS_PROVISIONING_REPORT_MAX_AGE_SECONDS', 3600):
+            _upload(ARCHIVE_FOLDER, 'provisioned-users-full', job_timestamp)
+            _upload(SIS_IMPORTS_FOLDER, 'user-provision', job_timestamp)
+            with tempfile.NamedTemporaryFile() as report_file:
+                report_specs = {'users': {'report_type': 'users', 'download_path': report_file.name}}
+                list(get_provisioning_reports(report_specs, _timestamp(), 'full'))
+                assert requested == [['users']]
+
+
+def _mock_get_csv_reports(monkeypatch):
+    requested = []
+
+    def _get_csv_reports(report_specs):
+        requested.append(list(report_specs))
+        for key in report_specs:
+            yield key, True
+    monkeypatch.setattr(canvas, 'get_csv_reports', _get_csv_reports)
+    return requested
+
+
+def _timestamp(minutes_ago=0):
+    return (utc_now() - timedelta(minutes=minutes_ago)).strftime('%F_%H-%M-%S')
+
+
+def _upload(folder, remote_name, timestamp, content=b'login_id\n'):
+    with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+        f.write(content)
+        f.flush()
+        assert upload_dated_csv(folder, f.name, remote_name, timestamp)
@@ -0,0 +1,72 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from collections import namedtuple
+import csv
+import io
+
+from ripley.lib import canvas_site_provisioning
+from ripley.lib.canvas_site_provisioning import process_course_enrollments
+
+
+class TestProcessCourseEnrollments:
+
+    def test_prefetch_keyed_by_section_term(self, app, monkeypatch):
+        requested_term_ids = []
+
+        def _get_term_enrollments(term_id, include_dropped=True, stream=False):
+            requested_term_ids.append(term_id)
+            ldap_uid = {'2232': '60000', '2235': '70000'}[term_id]
+            return [{'section_id': '32936', 'ldap_uid': ldap_uid, 'sis_enrollment_status': 'E'}]
+
+        monkeypatch.setattr(canvas_site_provisioning, 'get_term_enrollments', _get_term_enrollments)
+        monkeypatch.setattr(canvas_site_provisioning, 'get_term_instructors', lambda term_id, stream=False: [])
+
+        term_prefetch = {}
+        enrollments_csv = io.StringIO()
+        csv_set = namedtuple('CsvSet', ['enrollment_terms'])({
+            'TERM:2023-B': csv.DictWriter(enrollments_csv, fieldnames=['course_id', 'user_id', 'role', 'section_id', 'status']),
+        })
+        for sis_section_id in ('SEC:2023-B-32936', 'SEC:2023-C-32936'):
+            process_course_enrollments(
+                'TERM:2023-B',
+                'CRS:ANTHRO-189-2023-B',
+                [sis_section_id],
+                {},
+                {},
+                {},
+                {},
+                csv_set,
+                {'60000': '30060000', '70000': '30070000'},
+                False,
+                primary_sections=[sis_section_id],
+                term_prefetch=term_prefetch,
+            )
+        assert requested_term_ids == ['2232', '2235']
+        assert set(term_prefetch.keys()) == {'2232', '2235'}
+        assert enrollments_csv.getvalue().splitlines() == [
+            'CRS:ANTHRO-189-2023-B,30060000,student,SEC:2023-B-32936,active',
+            'CRS:ANTHRO-189-2023-B,30070000,student,SEC:2023-C-32936,active',
+        ]
@@ -0,0 +1,72 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+from ripley.lib.util import clear_request_memo, request_memoized
+
+
+class TestRequestMemoized:
+
+    def test_memoized_within_request(self, app):
+        calls = []
+
+        @request_memoized
+        def _lookup(canvas_site_id, user_id=None):
+            calls.append((canvas_site_id, user_id))
+            return None
+
+        with app.test_request_context():
+            assert _lookup('1234', user_id='5678') is None
+            assert _lookup('1234', user_id='5678') is None
+            _lookup('1234')
+            assert calls == [('1234', '5678'), ('1234', None)]
+            clear_request_memo(_lookup)
+            _lookup('1234')
+            assert len(calls) == 3
+        with app.test_request_context():
+            _lookup('1234')
+            assert len(calls) == 4
+
+    def test_memo_keyed_by_argument_string(self, app):
+        calls = []
+
+        @request_memoized
+        def _lookup(canvas_site_id, user_ids=None):
+            calls.append(canvas_site_id)
+
+        with app.test_request_context():
+            _lookup('1234', user_ids=['5678'])
+            _lookup(1234, user_ids=['5678'])
+            assert calls == ['1234']
+
+    def test_called_through_outside_request(self, app):
+        calls = []
+
+        @request_memoized
+        def _lookup(canvas_site_id):
+            calls.append(canvas_site_id)
+
+        _lookup('1234')
+        _lookup('1234')
+        assert len(calls) == 2
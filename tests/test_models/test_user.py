@@ -0,0 +1,91 @@
+"""
+Copyright ©2024. The Regents of the University of California (Regents). All Rights Reserved.
+
+Permission to use, copy, modify, and distribute this software and its documentation
+for educational, research, and not-for-profit purposes, without fee and without a
+signed licensing agreement, is hereby granted, provided that the above copyright
+notice, this paragraph and the following two paragraphs appear in all copies,
+modifications, and distributions.
+
+Contact The Office of Technology Licensing, UC Berkeley, 2150 Shattuck Avenue,
+Suite 510, Berkeley, CA 94720-1620, (510) 643-7201, otl@berkeley.edu,
+http://ipira.berkeley.edu/industry-info for commercial licensing opportunities.
+
+IN NO EVENT SHALL REGENTS BE LIABLE TO ANY PARTY FOR DIRECT, INDIRECT, SPECIAL,
+INCIDENTAL, OR CONSEQUENTIAL DAMAGES, INCLUDING LOST PROFITS, ARISING OUT OF
+THE USE OF THIS SOFTWARE AND ITS DOCUMENTATION, EVEN IF REGENTS HAS BEEN ADVISED
+OF THE POSSIBILITY OF SUCH DAMAGE.
+
+REGENTS SPECIFICALLY DISCLAIMS ANY WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE. THE
+SOFTWARE AND ACCOMPANYING DOCUMENTATION, IF ANY, PROVIDED HEREUNDER IS PROVIDED
+"AS IS". REGENTS HAS NO OBLIGATION TO PROVIDE MAINTENANCE, SUPPORT, UPDATES,
+ENHANCEMENTS, OR MODIFICATIONS.
+"""
+
+import json
+import time
+
+from ripley.externals.redis import fetch_cached_dict_object, local_cache
+from ripley.models.user import delete_cached_user_profiles, User
+from tests.util import enable_redis_cache
+
+
+class TestUserProfileCache:
+
+    def test_profile_cached(self, app, monkeypatch):
+        loads = _mock_load_user(monkeypatch)
+        with enable_redis_cache(app):
+            assert User(_composite_key('10001', 1)).user['name'] == 'profile 1'
+            assert User(_composite_key('10001', 1)).user['name'] == 'profile 1'
+            assert loads == [('10001', 1)]
+            assert fetch_cached_dict_object('user_profile:10001:1')['name'] == 'profile 1'
+
+    def test_refresh_bypasses_cache(self, app, monkeypatch):
+        loads = _mock_load_user(monkeypatch)
+        with enable_redis_cache(app):
+            User(_composite_key('10001', 1))
+            assert User(_composite_key('10001', 1), refresh=True).user['name'] == 'profile 2'
+            assert User(_composite_key('10001', 1)).user['name'] == 'profile 2'
+            assert loads == [('10001', 1), ('10001', 1)]
+
+    def test_stale_profile_refreshed_in_background(self, app, monkeypatch):
+        loads = _mock_load_user(monkeypatch)
+        with enable_redis_cache(app) as redis_conn:
+            User(_composite_key('10001', 1))
+            local_cache.clear()
+            redis_conn.expire('user_profile:10001:1', app.config['USER_PROFILE_CACHE_STALE_SECONDS'] - 1)
+            user = User(_composite_key('10001', 1))
+            assert user.user['name'] == 'profile 1'
+            # The refresh loads the profile of the UID it was started for, whatever happens to the User object meanwhile.
+            user.uid = None
+            deadline = time.monotonic() + 3
+            while len(loads) < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert loads == [('10001', 1), ('10001', 1)]
+
+    def test_delete_profiles_of_one_uid(self, app, monkeypatch):
+        _mock_load_user(monkeypatch)
+        with enable_redis_cache(app) as redis_conn:
+            for uid, canvas_site_id in (('12', 1), ('12', 2), ('123', 1)):
+                User(_composite_key(uid, canvas_site_id))
+            delete_cached_user_profiles('12')
+            assert fetch_cached_dict_object('user_profile:12:1') is None
+            assert fetch_cached_dict_object('user_profile:12:2') is None
+            assert fetch_cached_dict_object('user_profile:123:1')['uid'] == '123'
+            assert not redis_conn.exists('user_profile_keys:12')
+
+
+def _composite_key(uid, canvas_site_id):
+    return json.dumps({'uid': uid, 'canvas_site_id': canvas_site_id})
+
+
+def _mock_load_user(monkeypatch):
+    loads = []
+
+    def _load_user(user, canvas_masquerading_user_id=None, canvas_site_id=None, canvas_user_profile=None):
+        if user.uid:
+            loads.append((user.uid, canvas_site_id))
+        return {'canvasSiteId': canvas_site_id, 'name': f'profile {len(loads)}', 'uid': user.uid}
+    monkeypatch.setattr(User, '_load_user', _load_user)
+    return loads
@@ -53,6 +53,22 @@ def mock_s3_bucket(app):
         yield s3
 
 
+@contextmanager
+def enable_redis_cache(app):
+    """Run the Redis cache layer, which is otherwise skipped under pytest, against the fake Redis client."""
+    from ripley.externals import redis as redis_cache
+    redis_conn = redis_cache.get_redis_conn(app)
+    redis_conn.flushall()
+    redis_cache.local_cache.clear()
+    redis_cache.cache_stats.clear()
+    try:
+        with override_config(app, 'RIPLEY_ENV', 'test-redis-cache'):
+            yield redis_conn
+    finally:
+        redis_conn.flushall()
+        redis_cache.local_cache.clear()
+
+
 @contextmanager
 def override_config(app, key, value):
     """Temporarily override an app config value."""